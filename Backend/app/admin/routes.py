@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from app.db import models
+from app.auth.deps import get_current_admin
+from app.core.logger import logger
+from app.core.config import settings
+from app.core.profiler import ProfilerBusy, collapsed, sample_stacks
+import asyncio
+import os
+import threading
+import traceback
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+@router.post(
+    "/profile",
+    response_class=PlainTextResponse,
+    summary="Profile this worker",
+    description="Sample the stacks of the worker handling the request and return them in collapsed flame graph format."
+)
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=settings.PROFILE_MAX_SECONDS, description="How long to sample for"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="Milliseconds between samples"),
+    all_threads: bool = Query(False, description="Sample every thread instead of only the event loop"),
+    current_user: models.User = Depends(get_current_admin)
+):
+    """
+    Run a time-boxed sampling profiler on the worker serving this request.
+
+    The event loop keeps serving other requests while samples are taken,
+    so the profile shows what the worker does under its live traffic.
+    With several workers only the one answering is profiled; its PID is
+    returned in the X-Worker-Pid header.
+
+    Parameters:
+    - **seconds**: How long to sample for
+    - **interval_ms**: Milliseconds between samples
+    - **all_threads**: Sample every thread instead of only the event loop
+
+    Returns:
+    - Collapsed stacks (`frame;frame;frame count` per line), ready for
+      flamegraph.pl or speedscope
+
+    Raises:
+    - HTTPException 403: If the user is not an admin
+    - HTTPException 409: If a profile is already running on this worker
+    """
+    try:
+        loop_thread = None if all_threads else threading.get_ident()
+        logger.info(f"🔬 Profiling worker {os.getpid()} for {seconds}s (requested by {current_user.email})")
+        stacks = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000, loop_thread)
+        return PlainTextResponse(
+            collapsed(stacks),
+            headers={
+                "X-Worker-Pid": str(os.getpid()),
+                "X-Profile-Samples": str(sum(stacks.values())),
+            }
+        )
+    except ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running on this worker"
+        )
+    except Exception as e:
+        logger.error(f"❌ Error profiling worker: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while profiling"
+        )
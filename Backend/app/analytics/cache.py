@@ -0,0 +1,83 @@
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.analytics.service import AnalyticsService, empty_analytics
+from app.cache.redis_handler import cache_json, get_cached_json, get_click_generation, acquire_lock
+from app.core.config import settings
+from app.core.logger import logger
+from app.db import schemas
+from app.db.database import async_session_factory
+
+# Keeps background refreshes referenced until they finish
+_refresh_tasks = set()
+
+
+def analytics_cache_key(url_id: int, days: int, granularity: str = "day") -> str:
+    return f"analytics:detailed:{url_id}:{days}:{granularity}"
+
+
+async def _compute_and_store(
+    db: AsyncSession, url_id: int, days: int, granularity: str, generation: int
+) -> schemas.DetailedAnalytics:
+    # Raises on failure, so an error is never cached as "no clicks"
+    analytics = await AnalyticsService(db).compute_detailed_analytics(url_id, days, granularity)
+    await cache_json(
+        analytics_cache_key(url_id, days, granularity),
+        {"generation": generation, "analytics": analytics.model_dump(mode="json")},
+        settings.ANALYTICS_CACHE_TTL
+    )
+    return analytics
+
+
+async def _refresh(url_id: int, days: int, granularity: str, generation: int):
+    try:
+        async with async_session_factory() as session:
+            await _compute_and_store(session, url_id, days, granularity, generation)
+    except Exception as e:
+        logger.error(f"❌ Error refreshing cached analytics for URL {url_id}: {str(e)}")
+
+
+def _schedule_refresh(url_id: int, days: int, granularity: str, generation: int):
+    task = asyncio.create_task(_refresh(url_id, days, granularity, generation))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def get_detailed_analytics_cached(
+    db: AsyncSession, url_id: int, days: int, granularity: str = "day"
+) -> schemas.DetailedAnalytics:
+    """
+    Detailed analytics for a URL, served from Redis where possible.
+
+    Entries are tagged with the URL's click generation. A matching entry is
+    fresh and returned as is. An entry from an older generation is returned
+    immediately while one background task (guarded by a short Redis lock)
+    recomputes it, so polling dashboards never wait on the aggregation.
+    Only a cold cache computes inline. A failed computation is never
+    stored: a stale entry stays in place, and a cold cache falls back to
+    empty analytics for this request only.
+
+    Args:
+        db: The request's database session
+        url_id: The database ID of the URL
+        days: Number of days to include in the analytics
+        granularity: Time bucket size of the time-based statistics
+    """
+    generation = await get_click_generation(url_id)
+    if generation is None:
+        # Redis is down: nothing to cache against
+        return await AnalyticsService(db).get_detailed_analytics(url_id, days, granularity)
+
+    cached = await get_cached_json(analytics_cache_key(url_id, days, granularity))
+    if cached:
+        if cached.get("generation") != generation:
+            lock_key = f"analytics:refresh:{url_id}:{days}:{granularity}"
+            if await acquire_lock(lock_key, settings.ANALYTICS_REFRESH_LOCK_TTL):
+                _schedule_refresh(url_id, days, granularity, generation)
+        return schemas.DetailedAnalytics.model_validate(cached["analytics"])
+
+    try:
+        return await _compute_and_store(db, url_id, days, granularity, generation)
+    except Exception as e:
+        # Same fallback as AnalyticsService.get_detailed_analytics, uncached
+        logger.error(f"❌ Error generating analytics for URL {url_id}: {str(e)}")
+        return empty_analytics(granularity)
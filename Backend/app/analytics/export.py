@@ -0,0 +1,134 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional
+from sqlalchemy.future import select
+from app.db.database import async_session_factory
+from app.db.dimensions import CLICK_DETAIL_COLUMNS, click_details
+from app.db.archive import stream_archived_clicks
+
+EXPORT_FORMATS = {
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+# Same fields as schemas.ClickLogResponse, in export column order
+EXPORT_COLUMNS = CLICK_DETAIL_COLUMNS
+EXPORT_FIELDS = tuple(column.key for column in EXPORT_COLUMNS)
+
+STREAM_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(value) -> str:
+    return json.dumps(value, default=_json_default, separators=(",", ":"))
+
+
+async def stream_clicks(url_id: int, since: datetime) -> AsyncIterator[dict]:
+    """
+    Yield the raw clicks of a URL since a point in time, oldest first, as dicts.
+
+    Archived days are read from their segment files first (see
+    app/db/archive.py), then the clicks still in Postgres. Rows come from
+    a server-side cursor in batches of STREAM_BATCH_SIZE, so only one batch
+    is in memory at a time. The generator opens its own session because
+    request-scoped sessions are closed before a streamed response body is
+    sent.
+    """
+    async for row in stream_archived_clicks(url_id, since):
+        yield row
+
+    async with async_session_factory() as session:
+        result = await session.stream(
+            select(*EXPORT_COLUMNS)
+            .where(click_details.c.url_id == url_id)
+            .where(click_details.c.clicked_at >= since)
+            .order_by(click_details.c.clicked_at)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            for row in rows:
+                yield dict(zip(EXPORT_FIELDS, row))
+
+
+async def ndjson_lines(rows: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """One JSON object per click"""
+    async for row in rows:
+        yield dumps(row) + "\n"
+
+
+async def csv_lines(rows: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """A header line followed by one CSV line per click"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    async for row in rows:
+        writer.writerow(
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in row.values()
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def json_document(
+    head: dict,
+    rows: AsyncIterator[dict],
+    tail: Optional[Callable[[], Awaitable[dict]]] = None
+) -> AsyncIterator[str]:
+    """
+    A single JSON object made of the `head` fields, a "raw_clicks" array
+    that is written out one click at a time, and the fields returned by
+    `tail`, which is awaited only after every row has been streamed.
+    """
+    yield dumps(head)[:-1] + ',"raw_clicks":['
+    first = True
+    async for row in rows:
+        yield ("" if first else ",") + dumps(row)
+        first = False
+    yield "]"
+    if tail:
+        fields = dumps(await tail())[1:-1]
+        if fields:
+            yield "," + fields
+    yield "}"
+
+
+async def encode(chunks: AsyncIterator[str], compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Buffer text chunks into ~64 KB byte blocks, optionally gzip-compressing
+    them on the fly.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    pending: list = []
+    size = 0
+
+    def flush(parts: Iterable[str]) -> bytes:
+        data = "".join(parts).encode()
+        return compressor.compress(data) if compressor else data
+
+    async for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_SIZE:
+            data = flush(pending)
+            pending, size = [], 0
+            if data:
+                yield data
+
+    data = flush(pending)
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
@@ -0,0 +1,188 @@
+"""
+Live click streams over Server-Sent Events.
+
+The redirect path publishes a small JSON event per click on the URL's
+Redis channel (see app/analytics/producer.py). Each live connection
+subscribes to that channel, so watching a link costs one Redis
+subscription and no database queries after the initial ownership check.
+
+Events are coalesced: a reader task drains the subscription into a bounded
+batch and the stream flushes it at most once per LIVE_FLUSH_INTERVAL. A
+slow client therefore gets fewer, larger messages instead of making Redis
+buffer the backlog, and only the newest LIVE_MAX_EVENTS clicks of a batch
+are sent in full (the rest are still counted).
+"""
+import asyncio
+import json
+import weakref
+from collections import deque
+from contextlib import suppress
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+from app.analytics.export import dumps
+from app.analytics.rollups import referrer_domain
+from app.cache.redis_handler import get_redis
+from app.core.config import settings
+from app.core.logger import logger
+
+ROLLING_WINDOW_SECONDS = 60
+
+# Open live connections in this process
+_connections = 0
+
+
+def click_channel(url_id: int) -> str:
+    return f"clicks:{url_id}"
+
+
+def click_event(click: dict) -> dict:
+    """The public part of a click, as published to live viewers (no IP or user agent)"""
+    return {
+        "clicked_at": click.get("clicked_at"),
+        "country": click.get("country"),
+        "city": click.get("city"),
+        "device_type": click.get("device_type"),
+        "browser": click.get("browser"),
+        "os": click.get("os"),
+        "referrer_domain": referrer_domain(click.get("referrer")),
+        "is_mobile": bool(click.get("is_mobile")),
+        "is_bot": bool(click.get("is_bot")),
+    }
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+class _Slot:
+    """One of the LIVE_MAX_CONNECTIONS live connections; released once"""
+
+    def __init__(self):
+        global _connections
+        _connections += 1
+        self.held = True
+
+    def release(self):
+        global _connections
+        if self.held:
+            self.held = False
+            _connections -= 1
+
+
+def open_live_stream(url_id: int, total_clicks: int) -> Optional[AsyncIterator[str]]:
+    """
+    Take a live connection slot and return the stream that holds it, or
+    None if every slot is taken. The slot is counted as soon as it is
+    handed out, so a burst of requests cannot overshoot the cap while
+    their responses are starting. The stream releases it when it ends,
+    or when it is discarded without ever being started.
+    """
+    if _connections >= settings.LIVE_MAX_CONNECTIONS:
+        return None
+    slot = _Slot()
+    stream = live_click_stream(url_id, total_clicks, slot)
+    weakref.finalize(stream, slot.release)
+    return stream
+
+
+class _Batch:
+    """Clicks received since the last flush, with a bounded event sample"""
+
+    def __init__(self, max_events: int):
+        self.clicks = 0
+        self.events: Deque[dict] = deque(maxlen=max_events)
+
+    def add(self, event: dict):
+        self.clicks += 1
+        self.events.append(event)
+
+    def drain(self) -> Tuple[int, List[dict]]:
+        clicks, events = self.clicks, list(self.events)
+        self.clicks = 0
+        self.events.clear()
+        return clicks, events
+
+
+async def _read(pubsub, batch: _Batch):
+    async for message in pubsub.listen():
+        if message["type"] == "message":
+            batch.add(json.loads(message["data"]))
+
+
+async def live_click_stream(url_id: int, total_clicks: int, slot: _Slot) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for one URL.
+
+    Emits a `snapshot` event on connect and then a `clicks` event whenever
+    new clicks arrived or the rolling one-minute count changed:
+    {"clicks", "total_clicks", "clicks_last_minute", "events"}. Idle
+    connections get a comment line every LIVE_HEARTBEAT_INTERVAL seconds.
+
+    Args:
+        url_id: The database ID of the URL
+        total_clicks: The URL's click count when the stream starts
+        slot: The connection slot taken for this stream (see open_live_stream)
+    """
+    pubsub = None
+    reader = None
+    try:
+        r = await get_redis()
+        if not r:
+            yield sse("error", {"detail": "Live stream unavailable"})
+            return
+
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(click_channel(url_id))
+        batch = _Batch(settings.LIVE_MAX_EVENTS)
+        reader = asyncio.create_task(_read(pubsub, batch))
+        loop = asyncio.get_running_loop()
+
+        # (time, clicks) per flush within the rolling window
+        recent: Deque[Tuple[float, int]] = deque()
+        last_minute = 0
+        idle = 0.0
+
+        yield f"retry: {settings.LIVE_RETRY_MS}\n\n"
+        yield sse("snapshot", {"total_clicks": total_clicks, "clicks_last_minute": 0})
+
+        while True:
+            await asyncio.sleep(settings.LIVE_FLUSH_INTERVAL)
+            if reader.done():
+                reader.result()  # surface the subscription error
+                break
+
+            now = loop.time()
+            clicks, events = batch.drain()
+            if clicks:
+                recent.append((now, clicks))
+            while recent and recent[0][0] <= now - ROLLING_WINDOW_SECONDS:
+                recent.popleft()
+            rolling = sum(count for _, count in recent)
+
+            if clicks or rolling != last_minute:
+                total_clicks += clicks
+                last_minute = rolling
+                idle = 0.0
+                yield sse("clicks", {
+                    "clicks": clicks,
+                    "total_clicks": total_clicks,
+                    "clicks_last_minute": rolling,
+                    "events": events,
+                })
+            else:
+                idle += settings.LIVE_FLUSH_INTERVAL
+                if idle >= settings.LIVE_HEARTBEAT_INTERVAL:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Live click stream for URL {url_id} failed: {str(e)}")
+        yield sse("error", {"detail": "Live stream interrupted"})
+    finally:
+        slot.release()
+        if reader:
+            reader.cancel()
+        if pubsub:
+            with suppress(Exception):
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
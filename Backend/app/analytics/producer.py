@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+from typing import Optional
+from redis.exceptions import RedisError
+from app.cache.redis_handler import get_redis, click_generation_key
+from app.core.logger import logger
+from app.analytics.unique_visitors import hll_key, hll_ttl_seconds
+from app.analytics.live import click_channel, click_event
+from app.analytics.export import dumps
+from app.analytics.trending import add_trending_click
+
+
+async def record_click_signals(url_id: int, click: dict, user_id: Optional[int] = None, recorded: bool = True):
+    """
+    Publish the Redis-side signals of a click in one pipelined round trip.
+    Failures are logged and never affect the redirect.
+
+    Redirects served from the URL cache write no click row, so for them
+    (`recorded=False`) only trending and the live event are sent: the
+    analytics generation and visitor sketches mirror the database.
+
+    Args:
+        url_id: The database ID of the clicked URL
+        click: Column values of the click_logs row
+        user_id: The owner of the URL, for per-user trending
+        recorded: Whether the click was written to click_logs
+    """
+    try:
+        r = await get_redis()
+        if not r:
+            return
+
+        clicked_at = click.get("clicked_at") or datetime.now(timezone.utc)
+        pipe = r.pipeline(transaction=False)
+
+        if recorded:
+            # New generation: cached analytics of this URL are now stale
+            pipe.incr(click_generation_key(url_id))
+
+            # Unique visitor sketch for the click's day
+            if click.get("ip_address"):
+                key = hll_key(url_id, clicked_at.astimezone(timezone.utc).date())
+                pipe.pfadd(key, click["ip_address"])
+                pipe.expire(key, hll_ttl_seconds())
+
+        # Time-decayed trending scores
+        add_trending_click(pipe, url_id, user_id, clicked_at.timestamp())
+
+        # Live viewers of this URL
+        pipe.publish(click_channel(url_id), dumps(click_event({**click, "clicked_at": clicked_at})))
+
+        await pipe.execute()
+    except RedisError as e:
+        logger.error(f"❌ Redis error recording click signals for URL {url_id}: {str(e)}")
+    except Exception as e:
+        logger.error(f"❌ Unexpected error recording click signals: {str(e)}")
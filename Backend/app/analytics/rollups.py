@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from app.db import models
+from app.db.database import engine
+from app.core.config import settings
+from app.core.logger import logger
+
+# Rollup rows are keyed by (url_id, bucket, dimension, value). The "_total"
+# dimension carries the overall click count of the bucket, and "location"
+# the country and city of a click joined by LOCATION_SEPARATOR.
+TOTAL = "_total"
+DIMENSIONS = ("device_type", "browser", "os", "country", "location", "referrer_domain", "is_mobile", "is_bot")
+UNKNOWN = "Unknown"
+DIRECT = "direct"
+LOCATION_SEPARATOR = "\t"
+
+ROLLUP_TABLES = {
+    "hour": models.ClickRollupHourly,
+    "day": models.ClickRollupDaily,
+}
+
+
+def referrer_domain(referrer: Optional[str]) -> str:
+    """Lower-cased host of a referrer URL, or "direct" when there is none"""
+    if not referrer:
+        return DIRECT
+    try:
+        return (urlsplit(referrer).hostname or DIRECT)[:255]
+    except ValueError:
+        return DIRECT
+
+
+def location_value(country: Optional[str], city: Optional[str]) -> str:
+    """Rollup value of a (country, city) pair; a missing city is stored as ''"""
+    return f"{country or UNKNOWN}{LOCATION_SEPARATOR}{city or ''}"[:255]
+
+
+def split_location(value: str) -> Tuple[Optional[str], Optional[str]]:
+    """The (country, city) of a location value, None where unknown"""
+    country, _, city = value.partition(LOCATION_SEPARATOR)
+    return (None if country == UNKNOWN else country), (city or None)
+
+
+def click_dimensions(click: dict) -> List[Tuple[str, str]]:
+    """
+    The (dimension, value) pairs a single click contributes to.
+
+    Args:
+        click: Column values of a click_logs row
+    """
+    return [
+        (TOTAL, ""),
+        ("device_type", (click.get("device_type") or UNKNOWN)[:255]),
+        ("browser", (click.get("browser") or UNKNOWN)[:255]),
+        ("os", (click.get("os") or UNKNOWN)[:255]),
+        ("country", click.get("country") or UNKNOWN),
+        ("location", location_value(click.get("country"), click.get("city"))),
+        ("referrer_domain", referrer_domain(click.get("referrer"))),
+        ("is_mobile", "true" if click.get("is_mobile") else "false"),
+        ("is_bot", "true" if click.get("is_bot") else "false"),
+    ]
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Truncate an aware timestamp to the start of its UTC hour or day"""
+    moment = moment.astimezone(timezone.utc)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def record_click_rollups(db: AsyncSession, url_id: int, click: dict, clicked_at: datetime):
+    """
+    Add one click to the hourly and daily rollups in the current transaction.
+
+    Args:
+        db: The database session
+        url_id: The database ID of the clicked URL
+        click: Column values of the click_logs row
+        clicked_at: When the click happened (aware)
+    """
+    dimensions = click_dimensions(click)
+    for granularity, table in ROLLUP_TABLES.items():
+        bucket = bucket_start(clicked_at, granularity)
+        stmt = insert(table.__table__).values([
+            {"url_id": url_id, "bucket": bucket, "dimension": dimension, "value": value, "clicks": 1}
+            for dimension, value in dimensions
+        ])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["url_id", "bucket", "dimension", "value"],
+            set_={"clicks": table.__table__.c.clicks + stmt.excluded.clicks},
+        ))
+
+
+# Mirrors click_dimensions() in SQL for backfills
+_BACKFILL_SQL = """
+    INSERT INTO {table} (url_id, bucket, dimension, value, clicks)
+    SELECT
+        c.url_id,
+        date_trunc('{granularity}', c.clicked_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+        d.dimension,
+        d.value,
+        count(*)
+    FROM click_logs c
+    LEFT JOIN devices dv ON dv.id = c.device_id
+    LEFT JOIN browsers b ON b.id = c.browser_id
+    LEFT JOIN operating_systems o ON o.id = c.os_id
+    LEFT JOIN referrers r ON r.id = c.referrer_id
+    CROSS JOIN LATERAL (VALUES
+        ('_total', ''),
+        ('device_type', left(coalesce(dv.value, 'Unknown'), 255)),
+        ('browser', left(coalesce(b.value, 'Unknown'), 255)),
+        ('os', left(coalesce(o.value, 'Unknown'), 255)),
+        ('country', coalesce(c.country, 'Unknown')),
+        ('location', left(coalesce(c.country, 'Unknown') || E'\\t' || coalesce(c.city, ''), 255)),
+        ('referrer_domain', coalesce(left(lower(substring(
+            r.value FROM '^[A-Za-z][A-Za-z0-9+.-]*://(?:[^@/]*@)?([^/:?#]+)'
+        )), 255), 'direct')),
+        ('is_mobile', CASE WHEN c.is_mobile THEN 'true' ELSE 'false' END),
+        ('is_bot', CASE WHEN c.is_bot THEN 'true' ELSE 'false' END)
+    ) AS d(dimension, value)
+    WHERE c.clicked_at >= :since
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (url_id, bucket, dimension, value) DO UPDATE SET clicks = EXCLUDED.clicks;
+"""
+
+
+async def backfill_rollups(conn: AsyncConnection, since: Optional[datetime] = None):
+    """
+    Recompute rollup buckets from raw click_logs.
+
+    Buckets from `since` (rounded down to the start of its day) onwards are
+    overwritten with exact counts, so the backfill is idempotent.
+
+    Args:
+        conn: An open connection inside a transaction
+        since: Earliest click to include (default: all history)
+    """
+    since = bucket_start(since, "day") if since else datetime(1970, 1, 1, tzinfo=timezone.utc)
+    for granularity, table in ROLLUP_TABLES.items():
+        await conn.execute(
+            text(_BACKFILL_SQL.format(table=table.__tablename__, granularity=granularity)),
+            {"since": since},
+        )
+
+
+def hourly_retention_days() -> int:
+    """
+    Days of hourly rollups to keep. The hourly time series and the heatmap
+    read them over windows of up to ANALYTICS_MAX_DAYS, plus the partial
+    hour they start in, so retention never goes below that.
+    """
+    return max(settings.ROLLUP_HOURLY_RETENTION_DAYS, settings.ANALYTICS_MAX_DAYS + 1)
+
+
+async def prune_hourly_rollups(conn: AsyncConnection) -> int:
+    """
+    Delete hourly rollup buckets older than hourly_retention_days(). Daily
+    rollups are kept: they are small and back every long window.
+
+    Returns:
+        The number of deleted rows
+    """
+    cutoff = bucket_start(datetime.now(timezone.utc) - timedelta(days=hourly_retention_days()), "hour")
+    result = await conn.execute(
+        text(f"DELETE FROM {ROLLUP_TABLES['hour'].__tablename__} WHERE bucket < :cutoff"),
+        {"cutoff": cutoff},
+    )
+    return result.rowcount
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Backfill click rollups from click_logs")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="ISO date or timestamp (UTC) to backfill from; default is all history")
+    args = parser.parse_args()
+
+    since = args.since
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    async with engine.begin() as conn:
+        await backfill_rollups(conn, since)
+    logger.info(f"✅ Backfilled click rollups since {since or 'the beginning'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
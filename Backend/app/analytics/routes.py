@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import cast, or_
+from sqlalchemy.dialects.postgresql import JSONB
 from app.db import models, schemas
 from app.db.database import get_async_session
 from app.auth.deps import get_current_user
@@ -8,13 +10,237 @@ from app.core.logger import logger
 from app.core.rate_limiter import rate_limiter
 from app.core.config import settings
 from app.analytics.service import AnalyticsService
-from fastapi.responses import JSONResponse
-import json
+from app.analytics.cache import get_detailed_analytics_cached
+from app.analytics.export import EXPORT_FORMATS, encode
+from app.analytics.live import open_live_stream
+from app.analytics.trending import get_trending
+from fastapi.responses import StreamingResponse
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
+@router.get(
+    "/overview",
+    response_model=schemas.AccountOverview,
+    summary="Get account overview",
+    description="Retrieve aggregated analytics across all shortened URLs of the authenticated user."
+)
+async def get_account_overview(
+    days: Optional[int] = Query(
+        default=settings.ANALYTICS_DEFAULT_DAYS,
+        ge=1,
+        le=settings.ANALYTICS_MAX_DAYS,
+        description=f"Number of days to include in the overview (1-{settings.ANALYTICS_MAX_DAYS})"
+    ),
+    top: int = Query(default=10, ge=1, le=100, description="Number of most clicked links to include"),
+    request: Request = None,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Get an overview of all of the current user's shortened URLs.
+    
+    This endpoint provides:
+    - Number of links, clicks in the window and all-time clicks
+    - The most clicked links in the window
+    - Clicks per day across the account
+    - Device breakdown and mobile/bot percentages
+    
+    It replaces calling the detailed analytics endpoint once per link.
+    
+    Parameters:
+    - **days** (optional): Number of days to include (default: {settings.ANALYTICS_DEFAULT_DAYS}, max: {settings.ANALYTICS_MAX_DAYS})
+    - **top** (optional): Number of top links to return (default: 10, max: 100)
+    
+    Returns:
+    - Account overview object
+    
+    Raises:
+    - HTTPException: If unauthorized or rate limited
+    """
+    try:
+        # Check rate limit
+        if request:
+            await rate_limiter.check_rate_limit(request, limit=100, window=3600)
+
+        analytics_service = AnalyticsService(db)
+        overview = await analytics_service.get_account_overview(current_user.id, days, top)
+
+        logger.info(f"📊 Generated account overview for user: {current_user.email}")
+        return overview
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error generating account overview: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while generating the account overview"
+        )
+
+@router.get(
+    "/trending",
+    response_model=schemas.TrendingResponse,
+    summary="Get trending links",
+    description="Retrieve the links with the most recent clicks, platform-wide or among the authenticated user's links."
+)
+async def get_trending_links(
+    window: Literal["hour", "day", "week"] = Query(
+        default="hour",
+        description="Half-life of the click decay: clicks one window old count half"
+    ),
+    scope: Literal["mine", "global"] = Query(default="mine", description="Rank your own links or all links"),
+    limit: int = Query(default=10, ge=1, le=100, description="Number of links to return"),
+    request: Request = None,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Get the links that are trending now.
+    
+    Links are ranked by a time-decayed click score kept in Redis and
+    updated on every redirect, so the ranking costs O(limit) and never
+    scans the click logs. Original URLs are only included for your own
+    links.
+    
+    Parameters:
+    - **window** (optional): hour (default), day or week
+    - **scope** (optional): mine (default) or global
+    - **limit** (optional): Number of links to return (default: 10, max: 100)
+    
+    Returns:
+    - Trending links, best first
+    
+    Raises:
+    - HTTPException: If trending data is unavailable, unauthorized, or rate limited
+    """
+    try:
+        # Check rate limit
+        if request:
+            await rate_limiter.check_rate_limit(request, limit=100, window=3600)
+
+        ranked = await get_trending(window, limit, current_user.id if scope == "mine" else None)
+        if ranked is None:
+            raise HTTPException(status_code=503, detail="Trending links are temporarily unavailable")
+
+        result = await db.execute(
+            select(models.URL.id, models.URL.short_code, models.URL.original_url, models.URL.user_id, models.URL.click_count)
+            .where(models.URL.id.in_([url_id for url_id, _ in ranked]))
+        )
+        urls = {row.id: row for row in result}
+
+        links = [
+            schemas.TrendingLink(
+                short_code=urls[url_id].short_code,
+                score=round(score, 3),
+                click_count=urls[url_id].click_count or 0,
+                original_url=urls[url_id].original_url if urls[url_id].user_id == current_user.id else None
+            )
+            for url_id, score in ranked
+            if url_id in urls
+        ]
+
+        logger.info(f"📈 Generated {scope} trending links ({window}) for user: {current_user.email}")
+        return schemas.TrendingResponse(window=window, scope=scope, links=links)
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error generating trending links: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while generating trending links"
+        )
+
+@router.post(
+    "/batch",
+    response_model=schemas.BatchAnalyticsResponse,
+    summary="Get analytics for many URLs",
+    description="Retrieve detailed analytics for a list of short codes or a tag in a single request."
+)
+async def get_batch_analytics(
+    batch: schemas.BatchAnalyticsRequest,
+    days: Optional[int] = Query(
+        default=settings.ANALYTICS_DEFAULT_DAYS,
+        ge=1,
+        le=settings.ANALYTICS_MAX_DAYS,
+        description=f"Number of days to include in the analytics (1-{settings.ANALYTICS_MAX_DAYS})"
+    ),
+    request: Request = None,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Get detailed analytics for many shortened URLs at once.
+    
+    Ownership of every link is checked with a single query and all
+    breakdowns are computed together, grouped by link.
+    
+    Parameters:
+    - **batch**: Short codes to report on and/or a tag selecting links
+      - short_codes: List of short codes (max: {settings.ANALYTICS_MAX_BATCH})
+      - tag: Include every link carrying this tag
+    - **days** (optional): Number of days to include (default: {settings.ANALYTICS_DEFAULT_DAYS}, max: {settings.ANALYTICS_MAX_DAYS})
+    
+    Returns:
+    - Analytics per link, combined analytics, and short codes that were not found
+    
+    Raises:
+    - HTTPException: If the batch is empty, lists or selects more than {settings.ANALYTICS_MAX_BATCH} links, unauthorized, or rate limited
+    """
+    try:
+        # Check rate limit
+        if request:
+            await rate_limiter.check_rate_limit(request, limit=20, window=3600)
+
+        if not batch.short_codes and not batch.tag:
+            raise HTTPException(status_code=400, detail="Provide short_codes or a tag")
+        if len(batch.short_codes) > settings.ANALYTICS_MAX_BATCH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Maximum {settings.ANALYTICS_MAX_BATCH} short codes allowed per batch"
+            )
+
+        # Get URLs and verify ownership in one query
+        selectors = []
+        if batch.short_codes:
+            selectors.append(models.URL.short_code.in_(batch.short_codes))
+        if batch.tag:
+            selectors.append(cast(models.URL.tags, JSONB).contains([batch.tag]))
+        # One row past the cap tells a tag that selects too many links apart
+        result = await db.execute(
+            select(models.URL)
+            .where(models.URL.user_id == current_user.id)
+            .where(or_(*selectors))
+            .order_by(models.URL.id)
+            .limit(settings.ANALYTICS_MAX_BATCH + 1)
+        )
+        urls = result.scalars().all()
+        if len(urls) > settings.ANALYTICS_MAX_BATCH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"The selection matches more than {settings.ANALYTICS_MAX_BATCH} links; narrow it down"
+            )
+
+        analytics_service = AnalyticsService(db)
+        analytics = await analytics_service.get_batch_analytics(urls, days)
+
+        found = {url.short_code for url in urls}
+        analytics.not_found = [code for code in dict.fromkeys(batch.short_codes) if code not in found]
+
+        logger.info(f"📊 Generated batch analytics for {len(urls)} URLs")
+        return analytics
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error generating batch analytics: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while generating analytics"
+        )
+
 @router.get(
     "/urls/{short_code}/detailed", 
     response_model=schemas.DetailedAnalytics,
@@ -29,6 +255,10 @@ async def get_detailed_analytics(
         le=settings.ANALYTICS_MAX_DAYS, 
         description=f"Number of days to include in the analytics (1-{settings.ANALYTICS_MAX_DAYS})"
     ),
+    granularity: Literal["minute", "hour", "day", "week"] = Query(
+        default="day",
+        description="Time bucket size of the time-based statistics"
+    ),
     request: Request = None,
     db: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
@@ -37,27 +267,40 @@ async def get_detailed_analytics(
     Get detailed analytics for a specific shortened URL.
     
     This endpoint provides comprehensive analytics including:
-    - Total clicks and unique visitors
-    - Time-based statistics (clicks per day)
+    - Total clicks and unique visitors (estimated with HyperLogLog for windows
+      longer than a day, standard error 0.81%)
+    - Time-based statistics (clicks per minute, hour, day or week)
+    - A day-of-week by hour-of-day heatmap (UTC)
     - Location-based statistics
     - Device, browser, and operating system breakdowns
     - Mobile vs desktop and bot percentage statistics
     
+    Results are cached per URL, window and granularity. After new clicks the previous
+    result may be returned once more while a fresh one is computed.
+    
     Parameters:
     - **short_code**: The short code of the URL to get analytics for
-    - **days** (optional): Number of days to include in the analytics (default: {settings.ANALYTICS_DEFAULT_DAYS}, max: {settings.ANALYTICS_MAX_DAYS})
+    - **days** (optional): Number of days to include in the analytics (default: {settings.ANALYTICS_DEFAULT_DAYS}, max: {settings.ANALYTICS_MAX_DAYS}).
+      Windows longer than a day start at midnight UTC of their first day; a 1-day window covers exactly the last 24 hours
+    - **granularity** (optional): minute, hour, day or week (default: day). Minute buckets are limited to {settings.ANALYTICS_MAX_TIME_BUCKETS} per request
     
     Returns:
     - Detailed analytics object with various statistics
     
     Raises:
-    - HTTPException: If URL not found, unauthorized, or rate limited
+    - HTTPException: If URL not found, the window has too many minute buckets, unauthorized, or rate limited
     """
     try:
         # Check rate limit
         if request:
             await rate_limiter.check_rate_limit(request, limit=100, window=3600)
 
+        if granularity == "minute" and days * 1440 > settings.ANALYTICS_MAX_TIME_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Minute granularity is limited to {settings.ANALYTICS_MAX_TIME_BUCKETS // 1440} days"
+            )
+
         # Get URL and verify ownership
         result = await db.execute(
             select(models.URL)
@@ -69,9 +312,8 @@ async def get_detailed_analytics(
         if not url:
             raise HTTPException(status_code=404, detail="URL not found or access denied")
 
-        # Get analytics
-        analytics_service = AnalyticsService(db)
-        analytics = await analytics_service.get_detailed_analytics(url.id, days)
+        # Get analytics (cached per click generation)
+        analytics = await get_detailed_analytics_cached(db, url.id, days, granularity)
 
         logger.info(f"📊 Generated detailed analytics for URL: {short_code}")
         return analytics
@@ -88,7 +330,8 @@ async def get_detailed_analytics(
 @router.get(
     "/urls/{short_code}/export",
     summary="Export analytics data",
-    description="Export complete analytics data and raw click logs for a shortened URL in JSON format."
+    description="Stream complete analytics data and raw click logs for a shortened URL as JSON, NDJSON or CSV.",
+    response_class=StreamingResponse
 )
 async def export_analytics(
     short_code: str,
@@ -98,6 +341,11 @@ async def export_analytics(
         le=settings.ANALYTICS_MAX_DAYS, 
         description=f"Number of days to include in the export (1-{settings.ANALYTICS_MAX_DAYS})"
     ),
+    format: Literal["json", "ndjson", "csv"] = Query(
+        default="json",
+        description="json: URL details, analytics and raw clicks; ndjson/csv: raw clicks only"
+    ),
+    compress: bool = Query(default=False, description="Gzip-compress the file on the fly"),
     request: Request = None,
     db: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
@@ -105,17 +353,21 @@ async def export_analytics(
     """
     Export complete analytics data for a shortened URL.
     
-    This endpoint provides a downloadable JSON file containing:
-    - URL details
-    - Processed analytics (all statistics)
+    This endpoint streams a downloadable file containing:
+    - URL details and processed analytics (json format only)
     - Raw click logs for detailed analysis
     
+    Click rows are read with a server-side cursor and written out as they
+    arrive, so exports of any size use a flat amount of memory.
+    
     Parameters:
     - **short_code**: The short code of the URL to export analytics for
     - **days** (optional): Number of days to include in the export (default: {settings.ANALYTICS_DEFAULT_DAYS}, max: {settings.ANALYTICS_MAX_DAYS})
+    - **format** (optional): json (default), ndjson or csv
+    - **compress** (optional): Return a gzip-compressed file
     
     Returns:
-    - JSON file attachment with complete analytics data
+    - File attachment with the exported analytics data
     
     Raises:
     - HTTPException: If URL not found, unauthorized, or rate limited
@@ -136,18 +388,21 @@ async def export_analytics(
         if not url:
             raise HTTPException(status_code=404, detail="URL not found or access denied")
 
-        # Get analytics export
+        # Get analytics export stream
         analytics_service = AnalyticsService(db)
-        export_data = await analytics_service.export_analytics(url.id, days)
+        chunks = await analytics_service.export_analytics(url, days, format)
 
-        # Convert to JSON
-        json_data = json.dumps(export_data.dict(), default=str)
+        media_type, extension = EXPORT_FORMATS[format]
+        filename = f"analytics_{short_code}_{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+        if compress:
+            media_type, filename = "application/gzip", f"{filename}.gz"
 
-        logger.info(f"📥 Exported analytics for URL: {short_code}")
-        return JSONResponse(
-            content=json.loads(json_data),  # Parse back to ensure valid JSON
+        logger.info(f"📥 Exporting analytics for URL: {short_code} ({format})")
+        return StreamingResponse(
+            encode(chunks, compress),
+            media_type=media_type,
             headers={
-                "Content-Disposition": f'attachment; filename="analytics_{short_code}_{datetime.utcnow().strftime("%Y%m%d")}.json"'
+                "Content-Disposition": f'attachment; filename="{filename}"'
             }
         )
     except HTTPException:
@@ -159,3 +414,75 @@ async def export_analytics(
             status_code=500,
             detail="An error occurred while exporting analytics"
         )
+
+@router.get(
+    "/urls/{short_code}/live",
+    summary="Live click stream",
+    description="Stream clicks on a shortened URL as they happen, as Server-Sent Events.",
+    response_class=StreamingResponse
+)
+async def live_clicks(
+    short_code: str,
+    request: Request = None,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Stream clicks on a shortened URL in real time.
+    
+    The stream (text/event-stream) starts with a `snapshot` event holding
+    the current total, followed by `clicks` events with the new clicks,
+    the running total and the clicks of the last minute. Clicks are
+    coalesced into at most one message per second; busy links send only
+    the most recent click details of each message.
+    
+    Events come from Redis pub/sub, so open streams do not query the
+    database. Use this instead of polling the analytics endpoints.
+    
+    Parameters:
+    - **short_code**: The short code of the URL to watch
+    
+    Returns:
+    - Server-Sent Events stream
+    
+    Raises:
+    - HTTPException: If URL not found, too many live streams are open, unauthorized, or rate limited
+    """
+    try:
+        # Check rate limit
+        if request:
+            await rate_limiter.check_rate_limit(request, limit=100, window=3600)
+
+        # Get URL and verify ownership
+        result = await db.execute(
+            select(models.URL)
+            .where(models.URL.short_code == short_code)
+            .where(models.URL.user_id == current_user.id)
+        )
+        url = result.scalar_one_or_none()
+        
+        if not url:
+            raise HTTPException(status_code=404, detail="URL not found or access denied")
+
+        stream = open_live_stream(url.id, url.click_count or 0)
+        if stream is None:
+            raise HTTPException(status_code=503, detail="Too many live streams, try again later")
+
+        logger.info(f"📡 Live click stream opened for URL: {short_code}")
+        return StreamingResponse(
+            stream,
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"
+            }
+        )
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error opening live click stream: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while opening the live click stream"
+        )
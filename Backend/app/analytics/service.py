@@ -1,254 +1,654 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from sqlalchemy import func, distinct, tuple_, literal_column
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Dict, Any, Optional
 from app.db import models, schemas
+from app.analytics.rollups import TOTAL, UNKNOWN, location_value, split_location
+from app.analytics.unique_visitors import count_unique_visitors, count_unique_visitors_many, count_unique_visitors_union
+from app.analytics.export import stream_clicks, ndjson_lines, csv_lines, json_document
+from app.db.dimensions import click_details
+from app.core.timing import span
 from collections import Counter
 import json
 
+def window_start(days: int) -> datetime:
+    """
+    Lower bound of an analytics window as an aware UTC timestamp.
+
+    click_logs is range-partitioned on clicked_at, so every click query
+    should filter on this bound to let Postgres prune older partitions.
+    """
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+def rollup_window_start(days: int) -> datetime:
+    """
+    Start of the UTC day the analytics window begins in.
+
+    Daily rollups cannot be split, so rollup windows are widened to whole
+    UTC days: a `days`-day window also counts the clicks earlier on its
+    first day, up to 24 hours more than the raw-click window.
+    """
+    return window_start(days).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def empty_analytics(granularity: str = "day") -> schemas.DetailedAnalytics:
+    """Analytics for a window without any clicks, in the requested granularity"""
+    return schemas.DetailedAnalytics(
+        granularity=granularity,
+        total_clicks=0,
+        unique_visitors=0,
+        time_based=[],
+        locations=[],
+        devices=[],
+        browsers=[],
+        operating_systems=[],
+        is_mobile_percentage=0,
+        is_bot_percentage=0
+    )
+
+# Dimensions of the GROUPING SETS breakdown query. GROUPING() returns a
+# bitmask over these (leftmost = most significant bit) with a bit set for
+# every dimension that is *not* part of the row's grouping set.
+# Constants are inlined as literals so the SELECT and GROUP BY expressions
+# are textually identical (bound parameters would not be).
+_CLICKS = click_details.c
+_UNKNOWN = literal_column("'Unknown'")
+_DAY = func.date_trunc(literal_column("'day'"), func.timezone(literal_column("'UTC'"), _CLICKS.clicked_at))
+_DEVICE = func.coalesce(_CLICKS.device_type, _UNKNOWN)
+_BROWSER = func.coalesce(_CLICKS.browser, _UNKNOWN)
+_OS = func.coalesce(_CLICKS.os, _UNKNOWN)
+_DIMENSIONS = (_DAY, _CLICKS.country, _CLICKS.city, _DEVICE, _BROWSER, _OS)
+
+TIME_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%dT%H:%M",
+    "hour": "%Y-%m-%dT%H:00",
+    "day": "%Y-%m-%d",
+    "week": "%Y-%m-%d",  # Monday the week starts on
+}
+
+_ALL = 0b111111
+SET_TOTAL = _ALL
+SET_DAY = _ALL & ~0b100000
+SET_LOCATION = _ALL & ~0b011000
+SET_DEVICE = _ALL & ~0b000100
+SET_BROWSER = _ALL & ~0b000010
+SET_OS = _ALL & ~0b000001
+
+class ClickAggregator:
+    """
+    Running breakdowns over click rows as they stream past, so an export
+    can report its analytics without scanning click_logs a second time.
+    Memory grows with the number of distinct dimension values only; visitor
+    IPs are tracked only when no HyperLogLog estimate is available.
+    """
+
+    def __init__(self, track_ips: bool = False):
+        self.total_clicks = 0
+        self.mobile_clicks = 0
+        self.bot_clicks = 0
+        self.days = Counter()
+        self.locations = Counter()
+        self.devices = Counter()
+        self.browsers = Counter()
+        self.operating_systems = Counter()
+        self.ips = set() if track_ips else None
+
+    def add(self, click: dict):
+        self.total_clicks += 1
+        self.mobile_clicks += bool(click["is_mobile"])
+        self.bot_clicks += bool(click["is_bot"])
+        self.days[click["clicked_at"].astimezone(timezone.utc).date()] += 1
+        self.locations[(click["country"], click["city"])] += 1
+        self.devices[click["device_type"] or UNKNOWN] += 1
+        self.browsers[click["browser"] or UNKNOWN] += 1
+        self.operating_systems[click["os"] or UNKNOWN] += 1
+        if self.ips is not None and click["ip_address"]:
+            self.ips.add(click["ip_address"])
+
+    async def consume(self, rows: AsyncIterator[dict]) -> AsyncIterator[dict]:
+        """Pass rows through unchanged while counting them"""
+        async for row in rows:
+            self.add(row)
+            yield row
+
 class AnalyticsService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def get_detailed_analytics(self, url_id: int, days: int = 30) -> schemas.DetailedAnalytics:
+    async def get_detailed_analytics(self, url_id: int, days: int = 30, granularity: str = "day") -> schemas.DetailedAnalytics:
         """
-        Get detailed analytics for a specific URL.
+        Get detailed analytics for a specific URL, or empty analytics if
+        they cannot be computed (see compute_detailed_analytics).
         
         Args:
             url_id: The database ID of the URL
             days: Number of days to include in the analytics
+            granularity: Time bucket size of time_based: minute, hour, day or week
             
         Returns:
             Detailed analytics object with various statistics
         """
         try:
-            # Get all clicks for the URL
+            return await self.compute_detailed_analytics(url_id, days, granularity)
+        except Exception as e:
+            # Log the error but return empty analytics rather than failing
+            from app.core.logger import logger
+            logger.error(f"Error generating analytics: {str(e)}")
+            return empty_analytics(granularity)
+
+    async def compute_detailed_analytics(self, url_id: int, days: int = 30, granularity: str = "day") -> schemas.DetailedAnalytics:
+        """
+        Compute detailed analytics for a specific URL; errors propagate, so
+        callers that cache the result never store a failed computation.
+        
+        Windows longer than a day are read from the daily rollups, so their
+        cost grows with the number of buckets rather than clicks; they start
+        at midnight UTC of their first day (see rollup_window_start). Shorter
+        windows are aggregated from raw clicks in a single GROUPING SETS
+        query. Either way memory use does not depend on click volume.
+        
+        For rollup windows unique visitors are a HyperLogLog estimate with
+        a standard error of 0.81% (see app/analytics/unique_visitors.py).
+        
+        Args:
+            url_id: The database ID of the URL
+            days: Number of days to include in the analytics
+            granularity: Time bucket size of time_based: minute, hour, day or week
+            
+        Returns:
+            Detailed analytics object with various statistics
+        """
+        with span("breakdown"):
+            if days > 1:
+                analytics = await self._get_rollup_analytics(url_id, days)
+            else:
+                analytics = await self._get_raw_analytics(url_id, days)
+        analytics.granularity = granularity
+        if not analytics.total_clicks:
+            return analytics
+
+        if granularity != "day":
+            with span("time_series"):
+                analytics.time_based = await self._get_time_series(url_id, days, granularity)
+        with span("heatmap"):
+            analytics.heatmap = await self._get_heatmap(url_id, days)
+        return analytics
+
+    async def _get_time_series(self, url_id: int, days: int, granularity: str) -> List[schemas.TimeBasedStats]:
+        """
+        Clicks per minute, hour or week. Minutes come from raw clicks (the
+        caller bounds the window), hours from the hourly rollups and weeks
+        from the daily rollups, so long windows never touch click_logs.
+        """
+        if granularity == "minute":
+            bucket = func.date_trunc(
+                literal_column("'minute'"), func.timezone(literal_column("'UTC'"), models.ClickLog.clicked_at)
+            )
             result = await self.db.execute(
-                select(models.ClickLog)
+                select(bucket, func.count())
                 .where(models.ClickLog.url_id == url_id)
-                .where(models.ClickLog.clicked_at >= datetime.utcnow() - timedelta(days=days))
+                .where(models.ClickLog.clicked_at >= window_start(days))
+                .group_by(bucket)
             )
-            clicks = result.scalars().all()
-
-            # Handle case with no clicks
-            if not clicks:
-                return schemas.DetailedAnalytics(
-                    total_clicks=0,
-                    unique_visitors=0,
-                    time_based=[],
-                    locations=[],
-                    devices=[],
-                    browsers=[],
-                    operating_systems=[],
-                    is_mobile_percentage=0,
-                    is_bot_percentage=0
-                )
+        elif granularity == "hour":
+            rollup = models.ClickRollupHourly
+            result = await self.db.execute(
+                select(rollup.bucket, rollup.clicks)
+                .where(rollup.url_id == url_id)
+                .where(rollup.bucket >= window_start(days).replace(minute=0, second=0, microsecond=0))
+                .where(rollup.dimension == TOTAL)
+            )
+        else:
+            rollup = models.ClickRollupDaily
+            bucket = func.date_trunc(literal_column("'week'"), func.timezone(literal_column("'UTC'"), rollup.bucket))
+            result = await self.db.execute(
+                select(bucket, func.sum(rollup.clicks))
+                .where(rollup.url_id == url_id)
+                .where(rollup.bucket >= rollup_window_start(days))
+                .where(rollup.dimension == TOTAL)
+                .group_by(bucket)
+            )
+        return self._get_time_based_stats(result.all(), TIME_BUCKET_FORMATS[granularity])
 
-            # Calculate unique visitors
-            unique_visitors = len(set(click.ip_address for click in clicks if click.ip_address))
+    async def _get_heatmap(self, url_id: int, days: int) -> List[schemas.HeatmapCell]:
+        """Clicks per (ISO day of week, hour of day) in UTC, from the hourly rollups"""
+        rollup = models.ClickRollupHourly
+        local = func.timezone(literal_column("'UTC'"), rollup.bucket)
+        day_of_week = func.extract(literal_column("'isodow'"), local)
+        hour = func.extract(literal_column("'hour'"), local)
+        result = await self.db.execute(
+            select(day_of_week, hour, func.sum(rollup.clicks))
+            .where(rollup.url_id == url_id)
+            .where(rollup.bucket >= window_start(days).replace(minute=0, second=0, microsecond=0))
+            .where(rollup.dimension == TOTAL)
+            .group_by(day_of_week, hour)
+            .order_by(day_of_week, hour)
+        )
+        return [
+            schemas.HeatmapCell(day_of_week=int(day), hour=int(hour), clicks=clicks)
+            for day, hour, clicks in result
+        ]
 
-            # Time-based stats
-            time_based = self._get_time_based_stats(clicks)
+    async def _get_raw_analytics(self, url_id: int, days: int) -> schemas.DetailedAnalytics:
+        """Aggregate every breakdown from raw click_logs in one round trip"""
+        result = await self.db.execute(
+            select(
+                func.grouping(*_DIMENSIONS).label("grouping"),
+                *_DIMENSIONS,
+                func.count().label("clicks"),
+                func.count(distinct(_CLICKS.ip_address)).label("unique_visitors"),
+                func.count().filter(_CLICKS.is_mobile.is_(True)).label("mobile"),
+                func.count().filter(_CLICKS.is_bot.is_(True)).label("bots"),
+            )
+            .where(_CLICKS.url_id == url_id)
+            .where(_CLICKS.clicked_at >= window_start(days))
+            .group_by(func.grouping_sets(
+                tuple_(),
+                tuple_(_DAY),
+                tuple_(_CLICKS.country, _CLICKS.city),
+                tuple_(_DEVICE),
+                tuple_(_BROWSER),
+                tuple_(_OS),
+            ))
+        )
+        sets: Dict[int, list] = {}
+        for row in result:
+            sets.setdefault(row[0], []).append(row[1:])
 
-            # Location stats
-            locations = self._get_location_stats(clicks)
+        totals = sets.get(SET_TOTAL)
+        if not totals or not totals[0][6]:
+            return empty_analytics()
+        _, _, _, _, _, _, total_clicks, unique_visitors, is_mobile, is_bot = totals[0]
 
-            # Device stats
-            devices = self._get_device_stats(clicks)
+        return self._assemble(
+            total_clicks=total_clicks,
+            unique_visitors=unique_visitors,
+            time_based=[(row[0], row[6]) for row in sets.get(SET_DAY, [])],
+            locations=[(row[1], row[2], row[6]) for row in sets.get(SET_LOCATION, [])],
+            devices=[(row[3], row[6]) for row in sets.get(SET_DEVICE, [])],
+            browsers=[(row[4], row[6]) for row in sets.get(SET_BROWSER, [])],
+            operating_systems=[(row[5], row[6]) for row in sets.get(SET_OS, [])],
+            mobile_clicks=is_mobile,
+            bot_clicks=is_bot
+        )
 
-            # Browser stats
-            browsers = self._get_browser_stats(clicks)
+    async def _get_rollup_analytics(self, url_id: int, days: int) -> schemas.DetailedAnalytics:
+        """
+        Build analytics from the daily rollups. The window is aligned to
+        whole UTC days (see rollup_window_start).
+        """
+        breakdowns = await self._get_rollup_breakdowns([url_id], days)
+        return self._assemble_breakdown(breakdowns.get(url_id))
 
-            # OS stats
-            operating_systems = self._get_os_stats(clicks)
+    async def _get_rollup_breakdowns(self, url_ids: List[int], days: int) -> Dict[int, dict]:
+        """
+        Read the daily rollups of several URLs with grouped queries keyed by
+        url_id. Returns, per URL with clicks in the window, a breakdown dict
+        of {"dimensions": {dimension: {value: clicks}}, "time_based":
+        {bucket: clicks}, "unique_visitors": int}.
+        """
+        since = rollup_window_start(days)
+        rollup = models.ClickRollupDaily
+        breakdowns: Dict[int, dict] = {}
+
+        result = await self.db.execute(
+            select(rollup.url_id, rollup.dimension, rollup.value, func.sum(rollup.clicks))
+            .where(rollup.url_id.in_(url_ids))
+            .where(rollup.bucket >= since)
+            .group_by(rollup.url_id, rollup.dimension, rollup.value)
+        )
+        for url_id, dimension, value, clicks in result:
+            breakdown = breakdowns.setdefault(url_id, {"dimensions": {}, "time_based": {}})
+            breakdown["dimensions"].setdefault(dimension, {})[value] = clicks
+        if not breakdowns:
+            return {}
 
-            # Mobile and bot percentages
-            total_clicks = len(clicks)
-            is_mobile = sum(1 for click in clicks if click.is_mobile)
-            is_bot = sum(1 for click in clicks if click.is_bot)
+        result = await self.db.execute(
+            select(rollup.url_id, rollup.bucket, rollup.clicks)
+            .where(rollup.url_id.in_(list(breakdowns)))
+            .where(rollup.bucket >= since)
+            .where(rollup.dimension == TOTAL)
+        )
+        for url_id, bucket, clicks in result:
+            breakdowns[url_id]["time_based"][bucket] = clicks
 
-            return schemas.DetailedAnalytics(
-                total_clicks=total_clicks,
-                unique_visitors=unique_visitors,
-                time_based=time_based,
-                locations=locations,
-                devices=devices,
-                browsers=browsers,
-                operating_systems=operating_systems,
-                is_mobile_percentage=(is_mobile / total_clicks * 100) if total_clicks > 0 else 0,
-                is_bot_percentage=(is_bot / total_clicks * 100) if total_clicks > 0 else 0
+        # Distinct visitors cannot be summed across buckets: merge the daily
+        # HyperLogLog sketches instead, falling back to an exact count
+        with span("unique_visitors"):
+            unique_visitors = await count_unique_visitors_many(list(breakdowns), since)
+        if unique_visitors is None:
+            result = await self.db.execute(
+                select(models.ClickLog.url_id, func.count(distinct(models.ClickLog.ip_address)))
+                .where(models.ClickLog.url_id.in_(list(breakdowns)))
+                .where(models.ClickLog.clicked_at >= since)
+                .group_by(models.ClickLog.url_id)
             )
-        except Exception as e:
-            # Log the error but return empty analytics rather than failing
-            from app.core.logger import logger
-            logger.error(f"Error generating analytics: {str(e)}")
-            return schemas.DetailedAnalytics(
-                total_clicks=0,
-                unique_visitors=0,
-                time_based=[],
-                locations=[],
-                devices=[],
-                browsers=[],
-                operating_systems=[],
-                is_mobile_percentage=0,
-                is_bot_percentage=0
+            unique_visitors = dict(result.all())
+        for url_id, breakdown in breakdowns.items():
+            breakdown["unique_visitors"] = unique_visitors.get(url_id, 0)
+        return breakdowns
+
+    async def _get_raw_breakdowns(self, url_ids: List[int], days: int) -> Dict[int, dict]:
+        """
+        The breakdown dicts of _get_rollup_breakdowns, aggregated from raw
+        click_logs with the GROUPING SETS query of _get_raw_analytics
+        keyed by url_id, for windows too short for the daily rollups.
+        """
+        url_id = _CLICKS.url_id
+        result = await self.db.execute(
+            select(
+                func.grouping(*_DIMENSIONS).label("grouping"),
+                url_id,
+                *_DIMENSIONS,
+                func.count().label("clicks"),
+                func.count(distinct(_CLICKS.ip_address)).label("unique_visitors"),
+                func.count().filter(_CLICKS.is_mobile.is_(True)).label("mobile"),
+                func.count().filter(_CLICKS.is_bot.is_(True)).label("bots"),
             )
+            .where(url_id.in_(url_ids))
+            .where(_CLICKS.clicked_at >= window_start(days))
+            .group_by(func.grouping_sets(
+                tuple_(url_id),
+                tuple_(url_id, _DAY),
+                tuple_(url_id, _CLICKS.country, _CLICKS.city),
+                tuple_(url_id, _DEVICE),
+                tuple_(url_id, _BROWSER),
+                tuple_(url_id, _OS),
+            ))
+        )
+        breakdowns: Dict[int, dict] = {}
+        for grouping, link, day, country, city, device, browser, os, clicks, unique_visitors, mobile, bots in result:
+            breakdown = breakdowns.setdefault(link, {"dimensions": {}, "time_based": {}, "unique_visitors": 0})
+            dimensions = breakdown["dimensions"]
+            if grouping == SET_TOTAL:
+                dimensions[TOTAL] = {"": clicks}
+                dimensions["is_mobile"] = {"true": mobile}
+                dimensions["is_bot"] = {"true": bots}
+                breakdown["unique_visitors"] = unique_visitors
+            elif grouping == SET_DAY:
+                breakdown["time_based"][day] = clicks
+            elif grouping == SET_LOCATION:
+                dimensions.setdefault("location", {})[location_value(country, city)] = clicks
+            elif grouping == SET_DEVICE:
+                dimensions.setdefault("device_type", {})[device] = clicks
+            elif grouping == SET_BROWSER:
+                dimensions.setdefault("browser", {})[browser] = clicks
+            elif grouping == SET_OS:
+                dimensions.setdefault("os", {})[os] = clicks
+        return breakdowns
 
-    def _get_time_based_stats(self, clicks: List[models.ClickLog]) -> List[schemas.TimeBasedStats]:
-        """Generate time-based statistics from click logs"""
-        try:
-            daily_clicks = Counter()
-            for click in clicks:
-                date_str = click.clicked_at.strftime('%Y-%m-%d')
-                daily_clicks[date_str] += 1
-            
-            return [
-                schemas.TimeBasedStats(date=date, clicks=count)
-                for date, count in sorted(daily_clicks.items())
-            ]
-        except Exception:
-            return []
+    def _assemble_breakdown(self, breakdown: Optional[dict]) -> schemas.DetailedAnalytics:
+        """Shape a rollup breakdown dict into the response model"""
+        if not breakdown:
+            return empty_analytics()
+        dimensions = breakdown["dimensions"]
+        total_clicks = dimensions.get(TOTAL, {}).get("", 0)
+        if not total_clicks:
+            return empty_analytics()
 
-    def _get_location_stats(self, clicks: List[models.ClickLog]) -> List[schemas.LocationStats]:
-        """
-        Generate location-based statistics from click logs.
-        Handles NULL country/city values.
+        return self._assemble(
+            total_clicks=total_clicks,
+            unique_visitors=breakdown["unique_visitors"],
+            time_based=list(breakdown["time_based"].items()),
+            locations=[
+                (*split_location(location), clicks)
+                for location, clicks in dimensions.get("location", {}).items()
+            ],
+            devices=list(dimensions.get("device_type", {}).items()),
+            browsers=list(dimensions.get("browser", {}).items()),
+            operating_systems=list(dimensions.get("os", {}).items()),
+            mobile_clicks=dimensions.get("is_mobile", {}).get("true", 0),
+            bot_clicks=dimensions.get("is_bot", {}).get("true", 0)
+        )
+
+    async def get_batch_analytics(self, urls: List[models.URL], days: int = 30) -> schemas.BatchAnalyticsResponse:
         """
-        try:
-            # Filter out clicks with None country
-            valid_clicks = [click for click in clicks if click.country is not None]
-            
-            # If no valid location data, return a single "Unknown" entry
-            if not valid_clicks:
-                return [schemas.LocationStats(country="Unknown", city=None, clicks=len(clicks))]
-            
-            location_clicks = Counter()
-            for click in valid_clicks:
-                key = (click.country or "Unknown", click.city)
-                location_clicks[key] += 1
+        Detailed analytics for many URLs at once, plus their combined total.
+        
+        All breakdowns come from the same grouped queries keyed by url_id,
+        so the number of queries does not grow with the batch size. Like
+        get_detailed_analytics, windows longer than a day are read from the
+        daily rollups and a one-day window from raw clicks.
+        
+        Args:
+            urls: The URLs to report on (ownership already checked)
+            days: Number of days to include in the analytics
             
-            return [
-                schemas.LocationStats(
-                    country=country or "Unknown",
-                    city=city,
-                    clicks=count
-                )
-                for (country, city), count in location_clicks.most_common()
-            ]
-        except Exception:
-            return [schemas.LocationStats(country="Unknown", city=None, clicks=len(clicks))]
+        Returns:
+            Per-link analytics and the combined analytics of all links
+        """
+        url_ids = [url.id for url in urls]
+        with span("breakdown"):
+            if not url_ids:
+                breakdowns = {}
+            elif days > 1:
+                breakdowns = await self._get_rollup_breakdowns(url_ids, days)
+            else:
+                breakdowns = await self._get_raw_breakdowns(url_ids, days)
 
-    def _get_device_stats(self, clicks: List[models.ClickLog]) -> List[schemas.DeviceStats]:
-        """Generate device statistics from click logs"""
-        try:
-            device_clicks = Counter()
-            for click in clicks:
-                device = click.device_type or "Unknown"
-                device_clicks[device] += 1
-            
-            return [
-                schemas.DeviceStats(device_type=device, clicks=count)
-                for device, count in device_clicks.most_common()
-            ]
-        except Exception:
-            return [schemas.DeviceStats(device_type="Unknown", clicks=len(clicks))]
+        combined = {"dimensions": {}, "time_based": Counter(), "unique_visitors": 0}
+        for breakdown in breakdowns.values():
+            for dimension, values in breakdown["dimensions"].items():
+                totals = combined["dimensions"].setdefault(dimension, Counter())
+                totals.update(values)
+            combined["time_based"].update(breakdown["time_based"])
 
-    def _get_browser_stats(self, clicks: List[models.ClickLog]) -> List[schemas.BrowserStats]:
-        """Generate browser statistics from click logs"""
-        try:
-            browser_clicks = Counter()
-            for click in clicks:
-                browser = click.browser or "Unknown"
-                browser_clicks[browser] += 1
-            
-            return [
-                schemas.BrowserStats(browser=browser, clicks=count)
-                for browser, count in browser_clicks.most_common()
-            ]
-        except Exception:
-            return [schemas.BrowserStats(browser="Unknown", clicks=len(clicks))]
+        if breakdowns and days > 1:
+            with span("unique_visitors"):
+                unique_visitors = await count_unique_visitors_union(list(breakdowns), rollup_window_start(days))
+            # Without Redis fall back to the largest per-link count (a lower bound)
+            combined["unique_visitors"] = (
+                unique_visitors if unique_visitors is not None
+                else max(breakdown["unique_visitors"] for breakdown in breakdowns.values())
+            )
+        elif breakdowns:
+            with span("unique_visitors"):
+                result = await self.db.execute(
+                    select(func.count(distinct(models.ClickLog.ip_address)))
+                    .where(models.ClickLog.url_id.in_(list(breakdowns)))
+                    .where(models.ClickLog.clicked_at >= window_start(days))
+                )
+            combined["unique_visitors"] = result.scalar()
 
-    def _get_os_stats(self, clicks: List[models.ClickLog]) -> List[schemas.OSStats]:
-        """Generate OS statistics from click logs"""
-        try:
-            os_clicks = Counter()
-            for click in clicks:
-                os = click.os or "Unknown"
-                os_clicks[os] += 1
-            
-            return [
-                schemas.OSStats(os=os, clicks=count)
-                for os, count in os_clicks.most_common()
-            ]
-        except Exception:
-            return [schemas.OSStats(os="Unknown", clicks=len(clicks))]
+        return schemas.BatchAnalyticsResponse(
+            links=[
+                schemas.LinkAnalytics(
+                    short_code=url.short_code,
+                    analytics=self._assemble_breakdown(breakdowns.get(url.id))
+                )
+                for url in urls
+            ],
+            combined=self._assemble_breakdown(combined),
+            not_found=[]
+        )
 
-    async def export_analytics(self, url_id: int, days: int = 30) -> schemas.AnalyticsExport:
+    async def get_account_overview(self, user_id: int, days: int = 30, top: int = 10) -> schemas.AccountOverview:
         """
-        Export complete analytics data for a specific URL.
+        Account-wide analytics across all of a user's URLs.
+        
+        Everything comes from a handful of grouped queries over the daily
+        rollups joined on urls.user_id, instead of one analytics call per
+        link.
         
         Args:
-            url_id: The database ID of the URL
-            days: Number of days to include in the export
+            user_id: The database ID of the account owner
+            days: Number of days to include in the window
+            top: Number of most clicked links to return
             
         Returns:
-            Export data with URL details, analytics, and raw click data
+            Account overview with totals, top links, clicks over time and device mix
         """
-        try:
-            # Get URL
-            result = await self.db.execute(
-                select(models.URL).where(models.URL.id == url_id)
-            )
-            url = result.scalar_one_or_none()
-            
-            if not url:
-                raise ValueError(f"URL with id {url_id} not found")
+        since = rollup_window_start(days)
+        rollup = models.ClickRollupDaily
 
-            # Get clicks
-            result = await self.db.execute(
-                select(models.ClickLog)
-                .where(models.ClickLog.url_id == url_id)
-                .where(models.ClickLog.clicked_at >= datetime.utcnow() - timedelta(days=days))
+        result = await self.db.execute(
+            select(func.count(models.URL.id), func.coalesce(func.sum(models.URL.click_count), 0))
+            .where(models.URL.user_id == user_id)
+        )
+        total_links, all_time_clicks = result.one()
+
+        def account_rollups(*columns):
+            return (
+                select(*columns)
+                .select_from(rollup)
+                .join(models.URL, models.URL.id == rollup.url_id)
+                .where(models.URL.user_id == user_id)
+                .where(rollup.bucket >= since)
             )
-            clicks = result.scalars().all()
 
-            # Get analytics
-            analytics = await self.get_detailed_analytics(url_id, days)
+        result = await self.db.execute(
+            account_rollups(rollup.dimension, rollup.value, func.sum(rollup.clicks))
+            .where(rollup.dimension.in_((TOTAL, "device_type", "is_mobile", "is_bot")))
+            .group_by(rollup.dimension, rollup.value)
+        )
+        breakdowns: Dict[str, Dict[str, int]] = {}
+        for dimension, value, clicks in result:
+            breakdowns.setdefault(dimension, {})[value] = clicks
+        total_clicks = breakdowns.get(TOTAL, {}).get("", 0)
 
-            return schemas.AnalyticsExport(
-                url=url,
-                analytics=analytics,
-                raw_clicks=clicks
-            )
-        except Exception as e:
-            from app.core.logger import logger
-            logger.error(f"Error exporting analytics: {str(e)}")
-            
-            # Get URL even if analytics fail
+        time_based, top_links = [], []
+        if total_clicks:
             result = await self.db.execute(
-                select(models.URL).where(models.URL.id == url_id)
+                account_rollups(rollup.bucket, func.sum(rollup.clicks))
+                .where(rollup.dimension == TOTAL)
+                .group_by(rollup.bucket)
             )
-            url = result.scalar_one_or_none()
-            
-            if not url:
-                raise ValueError(f"URL with id {url_id} not found")
-                
-            # Return minimal export with empty analytics
-            empty_analytics = schemas.DetailedAnalytics(
-                total_clicks=0,
-                unique_visitors=0,
-                time_based=[],
-                locations=[],
-                devices=[],
-                browsers=[],
-                operating_systems=[],
-                is_mobile_percentage=0,
-                is_bot_percentage=0
+            time_based = result.all()
+
+            result = await self.db.execute(
+                account_rollups(models.URL.short_code, models.URL.original_url, func.sum(rollup.clicks).label("clicks"))
+                .where(rollup.dimension == TOTAL)
+                .group_by(models.URL.id)
+                .order_by(func.sum(rollup.clicks).desc())
+                .limit(top)
             )
+            top_links = [
+                schemas.TopLinkStats(short_code=short_code, original_url=original_url, clicks=clicks)
+                for short_code, original_url, clicks in result
+            ]
+
+        return schemas.AccountOverview(
+            total_links=total_links,
+            total_clicks=total_clicks,
+            all_time_clicks=all_time_clicks,
+            top_links=top_links,
+            time_based=self._get_time_based_stats(time_based),
+            devices=[
+                schemas.DeviceStats(device_type=device, clicks=clicks)
+                for device, clicks in self._most_common(list(breakdowns.get("device_type", {}).items()))
+            ],
+            is_mobile_percentage=(breakdowns.get("is_mobile", {}).get("true", 0) / total_clicks * 100) if total_clicks else 0,
+            is_bot_percentage=(breakdowns.get("is_bot", {}).get("true", 0) / total_clicks * 100) if total_clicks else 0
+        )
+
+    def _assemble(
+        self,
+        total_clicks: int,
+        unique_visitors: int,
+        time_based: List[tuple],
+        locations: List[tuple],
+        devices: List[tuple],
+        browsers: List[tuple],
+        operating_systems: List[tuple],
+        mobile_clicks: int,
+        bot_clicks: int
+    ) -> schemas.DetailedAnalytics:
+        """
+        Shape aggregated (value..., clicks) tuples into the response model.
+        Breakdowns are ordered by click count, time buckets chronologically.
+        """
+        return schemas.DetailedAnalytics(
+            total_clicks=total_clicks,
+            unique_visitors=unique_visitors,
+            time_based=self._get_time_based_stats(time_based),
+            locations=self._get_location_stats(locations, total_clicks),
+            devices=[
+                schemas.DeviceStats(device_type=device, clicks=clicks)
+                for device, clicks in self._most_common(devices)
+            ],
+            browsers=[
+                schemas.BrowserStats(browser=browser, clicks=clicks)
+                for browser, clicks in self._most_common(browsers)
+            ],
+            operating_systems=[
+                schemas.OSStats(os=os, clicks=clicks)
+                for os, clicks in self._most_common(operating_systems)
+            ],
+            is_mobile_percentage=mobile_clicks / total_clicks * 100,
+            is_bot_percentage=bot_clicks / total_clicks * 100
+        )
+
+    @staticmethod
+    def _most_common(rows: List[tuple]) -> List[tuple]:
+        """Order (value..., clicks) tuples by click count, highest first"""
+        return sorted(rows, key=lambda row: row[-1], reverse=True)
+
+    def _get_time_based_stats(self, rows: List[tuple], fmt: str = '%Y-%m-%d') -> List[schemas.TimeBasedStats]:
+        """Build time-based statistics from (bucket, clicks) tuples"""
+        return [
+            schemas.TimeBasedStats(date=bucket.strftime(fmt), clicks=clicks)
+            for bucket, clicks in sorted(rows, key=lambda row: row[0])
+        ]
+
+    def _get_location_stats(self, rows: List[tuple], total_clicks: int) -> List[schemas.LocationStats]:
+        """
+        Build location statistics from (country, city, clicks) tuples.
+        Clicks without a country are left out; if no click has location
+        data a single "Unknown" entry covers all of them.
+        """
+        valid_rows = [row for row in rows if row[0] is not None]
+        if not valid_rows:
+            return [schemas.LocationStats(country="Unknown", city=None, clicks=total_clicks)]
+
+        return [
+            schemas.LocationStats(country=country, city=city, clicks=clicks)
+            for country, city, clicks in self._most_common(valid_rows)
+        ]
+
+    async def export_analytics(self, url: models.URL, days: int = 30, fmt: str = "json") -> AsyncIterator[str]:
+        """
+        Export complete analytics data for a specific URL as a stream.
+        
+        Raw clicks are read through a server-side cursor and written out
+        row by row, so memory stays flat regardless of click count. The
+        json format computes its analytics from that same pass, so every
+        export reads click_logs exactly once.
+        
+        Args:
+            url: The URL being exported
+            days: Number of days to include in the export
+            fmt: "json" (URL details, raw clicks and analytics), "ndjson"
+                or "csv" (raw clicks only)
             
-            return schemas.AnalyticsExport(
-                url=url,
-                analytics=empty_analytics,
-                raw_clicks=[]
-            )
+        Returns:
+            An async iterator of text chunks
+        """
+        since = window_start(days)
+        rows = stream_clicks(url.id, since)
+        if fmt == "ndjson":
+            return ndjson_lines(rows)
+        if fmt == "csv":
+            return csv_lines(rows)
+
+        # Sketch lookup only touches Redis; exact IPs are a fallback
+        with span("unique_visitors"):
+            unique_visitors = await count_unique_visitors(url.id, since)
+        aggregator = ClickAggregator(track_ips=unique_visitors is None)
+
+        async def analytics() -> dict:
+            if not aggregator.total_clicks:
+                return {"analytics": empty_analytics().model_dump(mode="json")}
+            return {"analytics": self._assemble(
+                total_clicks=aggregator.total_clicks,
+                unique_visitors=len(aggregator.ips) if aggregator.ips is not None else unique_visitors,
+                time_based=list(aggregator.days.items()),
+                locations=[(country, city, clicks) for (country, city), clicks in aggregator.locations.items()],
+                devices=list(aggregator.devices.items()),
+                browsers=list(aggregator.browsers.items()),
+                operating_systems=list(aggregator.operating_systems.items()),
+                mobile_clicks=aggregator.mobile_clicks,
+                bot_clicks=aggregator.bot_clicks
+            ).model_dump(mode="json")}
+
+        head = {"url": schemas.URLListResponse.model_validate(url).model_dump(mode="json")}
+        return json_document(head, aggregator.consume(rows), tail=analytics)
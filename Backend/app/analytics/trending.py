@@ -0,0 +1,100 @@
+"""
+Trending links from time-decayed click scores in Redis sorted sets.
+
+Every click adds 2^((t - epoch_start) / half_life) to the link's score, so
+a score is the link's click count with each click weighted down by half
+per half-life of age ("forward decay": old scores never need rewriting).
+To keep the weights inside float range the base moves every
+EPOCH_HALF_LIVES half-lives: each click is written to the current epoch's
+set and, in that epoch's base, to the next one, so a new epoch starts out
+with the recent history it needs. Reading the top K is a single
+ZREVRANGE on the current set, O(log N + K), and never touches click_logs.
+"""
+import random
+import time
+from typing import List, Optional, Tuple
+from redis.exceptions import RedisError
+from app.cache.redis_handler import get_redis
+from app.core.config import settings
+from app.core.logger import logger
+
+# Window name -> half-life in seconds
+TRENDING_WINDOWS = {
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+}
+EPOCH_HALF_LIVES = 16
+TRIM_PROBABILITY = 0.01
+
+
+def _epoch(now: float, half_life: int) -> int:
+    return int(now // (half_life * EPOCH_HALF_LIVES))
+
+
+def _weight(now: float, half_life: int, epoch: int) -> float:
+    return 2 ** ((now - epoch * half_life * EPOCH_HALF_LIVES) / half_life)
+
+
+def trending_key(window: str, epoch: int, user_id: Optional[int] = None) -> str:
+    scope = f"user:{user_id}" if user_id else "global"
+    return f"trending:{window}:{scope}:{epoch}"
+
+
+def add_trending_click(pipe, url_id: int, user_id: Optional[int], now: Optional[float] = None):
+    """
+    Queue the score updates of one click on a Redis pipeline, for the
+    platform-wide ranking and the owner's ranking of every window.
+
+    Args:
+        pipe: A Redis pipeline
+        url_id: The database ID of the clicked URL
+        user_id: The owner of the URL, if any
+        now: Unix time of the click (default: now)
+    """
+    now = now or time.time()
+    trim = random.random() < TRIM_PROBABILITY
+    scopes = (None, user_id) if user_id else (None,)
+    for window, half_life in TRENDING_WINDOWS.items():
+        epoch = _epoch(now, half_life)
+        ttl = 2 * half_life * EPOCH_HALF_LIVES
+        for target in (epoch, epoch + 1):
+            weight = _weight(now, half_life, target)
+            for scope in scopes:
+                key = trending_key(window, target, scope)
+                pipe.zincrby(key, weight, url_id)
+                pipe.expire(key, ttl)
+                if trim:
+                    # Links below the top TRENDING_MAX_MEMBERS can never make a top-K list
+                    pipe.zremrangebyrank(key, 0, -(settings.TRENDING_MAX_MEMBERS + 1))
+
+
+async def get_trending(window: str, limit: int, user_id: Optional[int] = None) -> Optional[List[Tuple[int, float]]]:
+    """
+    The highest scoring links of a window.
+
+    Args:
+        window: One of TRENDING_WINDOWS
+        limit: Number of links to return
+        user_id: Rank only this user's links (default: platform-wide)
+
+    Returns:
+        (url_id, score) pairs, best first, where score is the decayed click
+        count as of now; or None if Redis is unavailable
+    """
+    try:
+        r = await get_redis()
+        if not r:
+            return None
+        now = time.time()
+        half_life = TRENDING_WINDOWS[window]
+        epoch = _epoch(now, half_life)
+        rows = await r.zrevrange(trending_key(window, epoch, user_id), 0, limit - 1, withscores=True)
+        scale = _weight(now, half_life, epoch)
+        return [(int(member), score / scale) for member, score in rows]
+    except RedisError as e:
+        logger.error(f"❌ Redis error reading trending links: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"❌ Unexpected error reading trending links: {str(e)}")
+        return None
@@ -0,0 +1,166 @@
+"""
+Approximate unique visitor counting with Redis HyperLogLog.
+
+Every URL gets one sketch per UTC day (`hll:visitors:{url_id}:{YYYYMMDD}`)
+fed with the visitor IP on each click. Sketches merge losslessly, so the
+unique visitors of any day range is a single PFCOUNT over that range's
+keys, using at most 12 KB per sketch no matter how many visitors it has
+seen. Redis reports cardinalities with a standard error of 0.81%.
+"""
+import argparse
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from app.cache.redis_handler import get_redis
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import engine
+
+HLL_STANDARD_ERROR = 0.0081
+BACKFILL_BATCH_SIZE = 5000
+MERGE_CHUNK_SIZE = 1000
+
+
+def hll_key(url_id: int, day: date) -> str:
+    return f"hll:visitors:{url_id}:{day.strftime('%Y%m%d')}"
+
+
+def hll_ttl_seconds() -> int:
+    """Sketches are kept as long as the longest analytics window needs them"""
+    return (settings.ANALYTICS_MAX_DAYS + 2) * 86400
+
+
+def hll_keys(url_id: int, since: datetime, until: Optional[datetime] = None) -> List[str]:
+    """Keys of all daily sketches between two timestamps (inclusive days)"""
+    day = since.astimezone(timezone.utc).date()
+    last = (until or datetime.now(timezone.utc)).astimezone(timezone.utc).date()
+    keys = []
+    while day <= last:
+        keys.append(hll_key(url_id, day))
+        day += timedelta(days=1)
+    return keys
+
+
+async def count_unique_visitors(url_id: int, since: datetime) -> Optional[int]:
+    """
+    Estimate distinct visitor IPs for a URL from `since` until now.
+
+    Returns:
+        The estimate, or None if Redis is unavailable so the caller can
+        fall back to an exact count
+    """
+    try:
+        r = await get_redis()
+        if not r:
+            return None
+        return await r.pfcount(*hll_keys(url_id, since))
+    except RedisError as e:
+        logger.error(f"❌ Redis error counting unique visitors for URL {url_id}: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"❌ Unexpected error counting unique visitors: {str(e)}")
+        return None
+
+
+async def count_unique_visitors_many(url_ids: List[int], since: datetime) -> Optional[Dict[int, int]]:
+    """
+    Estimate distinct visitor IPs for several URLs in one pipelined round trip.
+
+    Returns:
+        Estimates keyed by url_id, or None if Redis is unavailable
+    """
+    try:
+        r = await get_redis()
+        if not r:
+            return None
+        pipe = r.pipeline(transaction=False)
+        for url_id in url_ids:
+            pipe.pfcount(*hll_keys(url_id, since))
+        return dict(zip(url_ids, await pipe.execute()))
+    except RedisError as e:
+        logger.error(f"❌ Redis error counting unique visitors for {len(url_ids)} URLs: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"❌ Unexpected error counting unique visitors: {str(e)}")
+        return None
+
+
+async def count_unique_visitors_union(url_ids: List[int], since: datetime) -> Optional[int]:
+    """
+    Estimate distinct visitor IPs across several URLs combined. The daily
+    sketches are merged into a temporary key in chunks so no single Redis
+    command has to carry every key.
+
+    Returns:
+        The estimate, or None if Redis is unavailable
+    """
+    try:
+        r = await get_redis()
+        if not r:
+            return None
+        keys = [key for url_id in url_ids for key in hll_keys(url_id, since)]
+        merged = f"hll:visitors:union:{uuid.uuid4().hex}"
+        try:
+            for start in range(0, len(keys), MERGE_CHUNK_SIZE):
+                await r.pfmerge(merged, *keys[start:start + MERGE_CHUNK_SIZE])
+            return await r.pfcount(merged) if keys else 0
+        finally:
+            await r.delete(merged)
+    except RedisError as e:
+        logger.error(f"❌ Redis error counting combined unique visitors: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"❌ Unexpected error counting combined unique visitors: {str(e)}")
+        return None
+
+
+async def backfill_unique_visitors(since: Optional[datetime] = None):
+    """
+    Rebuild daily sketches from raw click_logs. PFADD is idempotent, so
+    re-running a backfill over the same range is harmless.
+    """
+    since = since or datetime.now(timezone.utc) - timedelta(days=settings.ANALYTICS_MAX_DAYS)
+    r = await get_redis()
+    if not r:
+        raise RuntimeError("Redis is not available")
+
+    async def flush(rows: Iterable):
+        pipe = r.pipeline(transaction=False)
+        keys = set()
+        for url_id, day, ip_address in rows:
+            key = hll_key(url_id, day)
+            pipe.pfadd(key, ip_address)
+            keys.add(key)
+        for key in keys:
+            pipe.expire(key, hll_ttl_seconds())
+        await pipe.execute()
+
+    async with engine.connect() as conn:
+        result = await conn.stream(text("""
+            SELECT DISTINCT url_id, (clicked_at AT TIME ZONE 'UTC')::date, host(ip_address)
+            FROM click_logs
+            WHERE clicked_at >= :since AND ip_address IS NOT NULL
+        """), {"since": since})
+        async for rows in result.partitions(BACKFILL_BATCH_SIZE):
+            await flush(rows)
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Backfill unique visitor sketches from click_logs")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help=f"ISO date or timestamp (UTC); default is the last {settings.ANALYTICS_MAX_DAYS} days")
+    args = parser.parse_args()
+
+    since = args.since
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    await backfill_unique_visitors(since)
+    logger.info("✅ Backfilled unique visitor sketches")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
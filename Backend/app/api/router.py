@@ -3,11 +3,13 @@ from app.auth.routes import router as auth_router
 from app.redirect.routes import router as redirect_router
 from app.url.routes import router as url_router
 from app.analytics.routes import router as analytics_router
+from app.admin.routes import router as admin_router
 
 router = APIRouter()
 
 # Include route modules
 router.include_router(auth_router)
+router.include_router(admin_router)
 router.include_router(redirect_router)
 router.include_router(url_router)
 router.include_router(analytics_router)
\ No newline at end of file
@@ -43,4 +43,14 @@ async def get_current_active_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Inactive user"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+async def get_current_admin(
+    current_user: models.User = Depends(get_current_user)
+) -> models.User:
+    if current_user.email.lower() not in {email.lower() for email in settings.ADMIN_EMAILS}:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
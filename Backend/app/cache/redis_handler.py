@@ -1,27 +1,21 @@
-from redis.asyncio import Redis
+from typing import NamedTuple, Optional
 from redis.exceptions import RedisError
 from app.core.config import settings
 from app.core.logger import logger
+from app.core.metrics import URL_CACHE_LOOKUPS
+from app.core.resources import resources
 import json
 
-# Initialize Redis client
-redis = None
+class CachedURL(NamedTuple):
+    original_url: str
+    url_id: int
+    user_id: Optional[int]
 
 async def get_redis():
-    """Get a Redis connection"""
-    global redis
-    if redis is None:
-        try:
-            redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
-            # Test the connection
-            await redis.ping()
-            logger.info("✅ Redis connection established")
-        except Exception as e:
-            logger.error(f"❌ Redis connection error: {str(e)}")
-            return None
-    return redis
+    """Get the worker's shared Redis client (see app/core/resources.py)"""
+    return resources.redis_client()
 
-async def get_cached_url(short_code: str) -> str:
+async def get_cached_url(short_code: str) -> Optional[CachedURL]:
     """
     Get a URL from cache by short code
     
@@ -29,28 +23,39 @@ async def get_cached_url(short_code: str) -> str:
         short_code: The short code to look up
         
     Returns:
-        The original URL if found, None otherwise
+        The original URL with its database ID and owner if found, None otherwise
     """
     try:
         r = await get_redis()
         if not r:
+            URL_CACHE_LOOKUPS.labels("error").inc()
             return None
             
-        return await r.get(f"url:{short_code}")
+        cached = await r.get(f"url:{short_code}")
+        try:
+            entry = CachedURL(**json.loads(cached)) if cached else None
+        except (ValueError, TypeError):
+            # Written before entries carried the URL's ID: re-resolve it
+            entry = None
+        URL_CACHE_LOOKUPS.labels("hit" if entry else "miss").inc()
+        return entry
     except RedisError as e:
+        URL_CACHE_LOOKUPS.labels("error").inc()
         logger.error(f"❌ Redis error getting URL {short_code}: {str(e)}")
         return None
     except Exception as e:
+        URL_CACHE_LOOKUPS.labels("error").inc()
         logger.error(f"❌ Unexpected error getting cached URL: {str(e)}")
         return None
 
-async def set_cached_url(short_code: str, original_url: str, ttl_seconds: int = None):
+async def set_cached_url(short_code: str, entry: CachedURL, ttl_seconds: int = None):
     """
     Cache a URL with its short code
     
     Args:
         short_code: The short code
-        original_url: The original URL to cache
+        entry: The original URL with its database ID and owner, so cache
+            hits can publish click signals without a database lookup
         ttl_seconds: Time-to-live in seconds (default from settings)
     """
     try:
@@ -59,7 +64,7 @@ async def set_cached_url(short_code: str, original_url: str, ttl_seconds: int =
             return
             
         ttl = ttl_seconds or settings.REDIS_CACHE_TTL
-        await r.set(f"url:{short_code}", original_url, ex=ttl)
+        await r.set(f"url:{short_code}", json.dumps(entry._asdict()), ex=ttl)
         logger.debug(f"🔄 Cached URL {short_code} for {ttl} seconds")
     except RedisError as e:
         logger.error(f"❌ Redis error caching URL {short_code}: {str(e)}")
@@ -131,4 +136,58 @@ async def get_cached_json(key: str):
         return None
     except Exception as e:
         logger.error(f"❌ Unexpected error getting cached JSON: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def click_generation_key(url_id: int) -> str:
+    return f"clickgen:{url_id}"
+
+async def get_click_generation(url_id: int):
+    """
+    Get the click generation counter of a URL. It is incremented on every
+    recorded click, so anything derived from a URL's clicks can be tagged
+    with the generation it was computed at.
+    
+    Args:
+        url_id: The database ID of the URL
+        
+    Returns:
+        The current generation (0 before the first click), or None if
+        Redis is unavailable
+    """
+    try:
+        r = await get_redis()
+        if not r:
+            return None
+            
+        return int(await r.get(click_generation_key(url_id)) or 0)
+    except RedisError as e:
+        logger.error(f"❌ Redis error getting click generation for {url_id}: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"❌ Unexpected error getting click generation: {str(e)}")
+        return None
+
+async def acquire_lock(key: str, ttl_seconds: int) -> bool:
+    """
+    Take a short-lived lock that expires on its own.
+    
+    Args:
+        key: The lock key
+        ttl_seconds: How long the lock is held at most
+        
+    Returns:
+        True if the lock was acquired, False if it is held elsewhere or
+        Redis is unavailable
+    """
+    try:
+        r = await get_redis()
+        if not r:
+            return False
+            
+        return bool(await r.set(key, "1", nx=True, ex=ttl_seconds))
+    except RedisError as e:
+        logger.error(f"❌ Redis error acquiring lock {key}: {str(e)}")
+        return False
+    except Exception as e:
+        logger.error(f"❌ Unexpected error acquiring lock: {str(e)}")
+        return False
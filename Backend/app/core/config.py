@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 import os
 
 class Settings(BaseSettings):
@@ -12,8 +12,11 @@ class Settings(BaseSettings):
     # Server
     HOST: str = "0.0.0.0"
     PORT: int = 8000
-    WORKERS: int = 1
-    RELOAD: bool = True
+    WORKERS: int = 1  # worker processes of app.server; 0 = one per CPU core
+    RELOAD: bool = True  # development only, and only with a single worker
+    WORKER_MAX_REQUESTS: int = 100000  # recycle a worker after this many requests; 0 = never
+    WORKER_MAX_REQUESTS_JITTER: float = 0.1  # each worker's limit varies by up to this fraction
+    GRACEFUL_SHUTDOWN_TIMEOUT: int = 30  # seconds in-flight requests get to finish
     
     # CORS
     CORS_ORIGINS: list = ["*"]
@@ -27,10 +30,16 @@ class Settings(BaseSettings):
     DB_POOL_SIZE: int = 5
     DB_MAX_OVERFLOW: int = 10
     DB_ECHO: bool = False
+    RUN_MIGRATIONS_ON_STARTUP: bool = True  # workers take turns under an advisory lock
 
     # Redis
     REDIS_URL: str = "redis://redis:6379/0"
     REDIS_CACHE_TTL: int = 3600  # 1 hour in seconds
+    REDIS_MAX_CONNECTIONS: int = 600  # per worker, including one per live click stream
+    REDIS_WARM_CONNECTIONS: int = 5  # opened at startup
+    REDIS_POOL_TIMEOUT: float = 5.0  # seconds to wait for a free connection
+    REDIS_CONNECT_TIMEOUT: float = 1.0
+    HEALTH_CHECK_TIMEOUT: float = 2.0  # per backend in /health/ready
 
     # JWT Auth Config
     SECRET_KEY: str = "shrinkr-dev-secret"
@@ -38,6 +47,7 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 hours
     
     # Rate Limiting
+    RATE_LIMIT_ENABLED: bool = True  # off only for load tests (see benchmarks/load.py)
     RATE_LIMIT_DEFAULT: int = 100  # requests per window
     RATE_LIMIT_WINDOW: int = 3600  # 1 hour in seconds
     
@@ -47,6 +57,7 @@ class Settings(BaseSettings):
     MAX_CUSTOM_ALIAS_LENGTH: int = 20
     MAX_BULK_URLS: int = 50
     MAX_DAILY_USER_URLS: int = 1000
+    URL_STREAM_BATCH_SIZE: int = 1000  # rows fetched per keyset page when streaming
     
     # Security
     MIN_PASSWORD_LENGTH: int = 8
@@ -56,14 +67,57 @@ class Settings(BaseSettings):
     # Analytics
     ANALYTICS_MAX_DAYS: int = 365
     ANALYTICS_DEFAULT_DAYS: int = 30
+    ANALYTICS_MAX_BATCH: int = 500  # short codes per batch analytics request
+    ANALYTICS_CACHE_TTL: int = 3600  # upper bound on how stale cached analytics can get
+    ANALYTICS_REFRESH_LOCK_TTL: int = 30  # at most one background recompute per key in this window
+    ANALYTICS_MAX_TIME_BUCKETS: int = 10080  # minute buckets per request (7 days)
     
+    # Live click streams
+    LIVE_FLUSH_INTERVAL: float = 1.0  # seconds between coalesced messages
+    LIVE_MAX_EVENTS: int = 50  # click events sent in full per message
+    LIVE_HEARTBEAT_INTERVAL: float = 15.0
+    LIVE_RETRY_MS: int = 3000  # client reconnect delay
+    LIVE_MAX_CONNECTIONS: int = 500  # per worker; each holds a Redis subscription
+    
+    # Trending links
+    TRENDING_MAX_MEMBERS: int = 10000  # links kept per ranking
+
+    # Click log partitioning
+    CLICK_LOG_PARTITIONS_AHEAD: int = 3  # monthly partitions created in advance
+    CLICK_LOG_RETENTION_MONTHS: int = 0  # 0 keeps every partition
+    PARTITION_MAINTENANCE_INTERVAL: int = 86400  # 1 day in seconds
+    ROLLUP_HOURLY_RETENTION_DAYS: int = 0  # hourly rollups kept; never below ANALYTICS_MAX_DAYS + 1 (0 = that minimum)
+    DIMENSION_CACHE_SIZE: int = 10000  # interned strings cached per dimension and worker
+
+    # Click archive
+    CLICK_ARCHIVE_AFTER_DAYS: int = 0  # 0 keeps raw clicks in Postgres
+    CLICK_ARCHIVE_DIR: str = "archive/clicks"
+
     # QR Code
     QR_CODE_DEFAULT_SIZE: int = 10
     QR_CODE_MIN_SIZE: int = 5
     QR_CODE_MAX_SIZE: int = 20
+    QR_CODE_DEFAULT_FORMAT: Literal["png", "svg"] = "png"  # single and batch QR codes
+    QR_CACHE_DIR: str = "cache/qr"
+    QR_CACHE_MAX_AGE: int = 86400  # 1 day in seconds
+    QR_RENDER_WORKERS: int = 2  # render threads per worker
+    QR_BATCH_PROCESSES: int = 2  # render processes for batches, per worker
+    QR_BATCH_MAX: int = 5000  # links per batch
     
+    # Metrics (set PROMETHEUS_MULTIPROC_DIR to aggregate across workers)
+    METRICS_PATH: str = "/metrics"
+    SERVER_TIMING: bool = True  # report request phase timings in a Server-Timing header
+
+    # Profiling
+    ADMIN_EMAILS: list = []  # users allowed to use the admin endpoints
+    PROFILE_MAX_SECONDS: int = 60
+
     # Logging
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Optional[str] = None  # "json" or "text"; default: text in development, json otherwise
+    LOG_FILE_MAX_BYTES: int = 10 * 1024 * 1024  # 10MB; the file is only written with WORKERS=1
+    LOG_QUEUE_SIZE: int = 10000  # records waiting for the log thread; more are dropped and counted
+    LOG_SAMPLE_RATES: dict = {"cache_hit": 0.01, "redirect": 0.01}  # fraction of hot-path INFO records kept
 
     def is_development(self) -> bool:
         return self.ENVIRONMENT.lower() == "development"
@@ -1,7 +1,12 @@
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
 import os
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from app.core.config import settings
 
 # Color codes for terminal (reset-safe)
@@ -19,10 +24,46 @@ COLOR_FORMAT = (
     "%(message)s"
 )
 
-# Plain format for file logs
-PLAIN_FORMAT = (
-    "[%(asctime)s] [%(levelname)s] [%(filename)s:%(funcName)s():%(lineno)d] %(message)s"
-)
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sample"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "location": f"{record.filename}:{record.funcName}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of high-volume records.
+
+    Records logged with `extra={"sample": "<name>"}` pass with the
+    probability configured in LOG_SAMPLE_RATES[name]. Warnings and errors
+    are never dropped, so log volume follows errors rather than traffic.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        name = getattr(record, "sample", None)
+        if name is None or record.levelno >= logging.WARNING:
+            return True
+        rate = settings.LOG_SAMPLE_RATES.get(name, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
 
 # Create logs directory
 LOG_DIR = "logs"
@@ -33,22 +74,79 @@ LOG_FILE_PATH = os.path.join(LOG_DIR, "shrinkr.log")
 logger = logging.getLogger("shrinkr")
 logger.setLevel(logging.DEBUG if settings.ENVIRONMENT == "development" else logging.INFO)
 
-# Console handler
+# Console handler: colored text in development, JSON elsewhere
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setLevel(logging.DEBUG)
-console_format = logging.Formatter(COLOR_FORMAT, datefmt="%Y-%m-%d %H:%M:%S")
-console_handler.setFormatter(console_format)
-logger.addHandler(console_handler)
-
-# File handler
-file_handler = RotatingFileHandler(
-    LOG_FILE_PATH,
-    maxBytes=1024 * 1024,  # 1MB
-    backupCount=5
-)
-file_handler.setLevel(logging.INFO)
-file_format = logging.Formatter(PLAIN_FORMAT, datefmt="%Y-%m-%d %H:%M:%S")
-file_handler.setFormatter(file_format)
-logger.addHandler(file_handler)
+if (settings.LOG_FORMAT or ("text" if settings.is_development() else "json")) == "json":
+    console_handler.setFormatter(JsonFormatter())
+else:
+    console_handler.setFormatter(logging.Formatter(COLOR_FORMAT, datefmt="%Y-%m-%d %H:%M:%S"))
+
+# File handler. Several worker processes rotating the same file would lose
+# and interleave records, so with more than one worker (see app/server.py)
+# logs only go to stdout, where the process manager collects them.
+file_handler = None
+if settings.WORKERS == 1:
+    file_handler = RotatingFileHandler(
+        LOG_FILE_PATH,
+        maxBytes=settings.LOG_FILE_MAX_BYTES,
+        backupCount=5
+    )
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(JsonFormatter())
+
+
+class _RecordQueueHandler(QueueHandler):
+    """
+    Hand records to the listener as they are, so the handlers format them.
+    When the queue is full records are dropped rather than blocking the
+    caller; the number dropped is logged once the listener catches up.
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        # Called under the handler lock, so the count needs no extra locking
+        if self.dropped:
+            report = logging.makeLogRecord({
+                "name": logger.name,
+                "levelno": logging.WARNING,
+                "levelname": logging.getLevelName(logging.WARNING),
+                "msg": f"⚠️ Dropped {self.dropped} log records: the log queue was full",
+                "filename": os.path.basename(__file__),
+                "funcName": "enqueue",
+            })
+            try:
+                self.queue.put_nowait(report)
+                self.dropped = 0
+            except queue.Full:
+                pass
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve %-arguments now (they may be mutated later) but leave
+        # formatting, tracebacks included, to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+# Handlers run on a background thread: callers only enqueue the record
+log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+handlers = [handler for handler in (console_handler, file_handler) if handler]
+queue_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+queue_listener.start()
+atexit.register(queue_listener.stop)
+
+logger.addHandler(_RecordQueueHandler(log_queue))
+logger.addFilter(SamplingFilter())
 
-logger.propagate = False
\ No newline at end of file
+logger.propagate = False
@@ -0,0 +1,143 @@
+"""
+Prometheus metrics.
+
+With several uvicorn workers each process writes its samples to memory-
+mapped files in PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them, so
+a scrape sees the whole server no matter which worker answers it. The
+directory must be set (and emptied) before the workers start; without it
+metrics are kept per process.
+"""
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from app.core.config import settings
+from app.core.timing import server_timing_header, start_request
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUESTS = Counter(
+    "shrinkr_http_requests_total",
+    "HTTP requests by route template, method and status code",
+    ["method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "shrinkr_http_request_duration_seconds",
+    "Time from request start to the end of the response body",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+URL_CACHE_LOOKUPS = Counter(
+    "shrinkr_url_cache_lookups_total",
+    "Short code lookups in the Redis URL cache",
+    ["result"],  # hit, miss or error
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "shrinkr_rate_limit_rejections_total",
+    "Requests rejected with 429 by the rate limiter",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "shrinkr_db_pool_checked_out",
+    "Database connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "shrinkr_db_pool_overflow",
+    "Database connections open beyond the pool size",
+    multiprocess_mode="livesum",
+)
+REQUEST_PHASE_LATENCY = Histogram(
+    "shrinkr_request_phase_duration_seconds",
+    "Time spent per request in each instrumented phase (see app/core/timing.py)",
+    ["route", "phase"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CLICKS_IN_FLIGHT = Gauge(
+    "shrinkr_click_ingestion_in_flight",
+    "Clicks currently being recorded (database write and Redis signals)",
+    multiprocess_mode="livesum",
+)
+
+
+def instrument_engine(engine):
+    """Track pool utilization of an async engine on every checkout and checkin"""
+    pool = engine.sync_engine.pool
+
+    def update(*_):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    event.listen(pool, "checkout", update)
+    event.listen(pool, "checkin", update)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Plain Starlette routes (docs, openapi) have fixed paths and set no route
+    return scope["path"] if "endpoint" in scope else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request counts, latencies and phase
+    timings per route template (not raw path, which would explode label
+    cardinality), and adding the phases as a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        spans = start_request()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING:
+                    header = server_timing_header(spans, time.perf_counter() - start)
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            path = _route_label(scope)
+            if path != settings.METRICS_PATH:
+                method = scope["method"]
+                REQUESTS.labels(method, path, str(status_code)).inc()
+                REQUEST_LATENCY.labels(method, path).observe(time.perf_counter() - start)
+                for phase, seconds in spans.items():
+                    REQUEST_PHASE_LATENCY.labels(path, phase).observe(seconds)
+
+
+def render_metrics():
+    """The current metrics in the Prometheus text format, and its content type"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead():
+    """Drop this worker's live gauges from the multiprocess store on shutdown"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,72 @@
+"""
+On-demand statistical sampling profiler.
+
+A background thread snapshots the Python stacks of the worker's threads
+at a fixed interval and counts identical stacks. The result is in the
+"collapsed stack" format (`frame;frame;frame count` per line, root
+first) read by flamegraph.pl, speedscope and most flame graph viewers.
+Nothing is instrumented, so overhead is bounded by the sampling rate and
+only exists while a profile is being taken.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """A profile is already being taken in this worker"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def _fold(frame, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(seconds: float, interval: float, thread_id: Optional[int] = None) -> Counter:
+    """
+    Sample thread stacks for `seconds` (blocking).
+
+    Args:
+        seconds: How long to sample for
+        interval: Seconds between samples
+        thread_id: Only sample this thread (default: every other thread)
+
+    Returns:
+        Collapsed stack -> number of samples
+
+    Raises:
+        ProfilerBusy: If another profile is in progress
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        own_id = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_id or (thread_id is not None and ident != thread_id):
+                    continue
+                stacks[_fold(frame, names.get(ident, f"thread-{ident}"))] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _lock.release()
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
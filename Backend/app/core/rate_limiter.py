@@ -1,14 +1,14 @@
 from fastapi import HTTPException, Request, status
-from redis import Redis
 from redis.exceptions import RedisError
 from datetime import datetime, timedelta
 import json
 from app.core.config import settings
 from app.core.logger import logger
+from app.core.metrics import RATE_LIMIT_REJECTIONS
+from app.cache.redis_handler import get_redis
 
 class RateLimiter:
-    def __init__(self, redis_client: Redis):
-        self.redis = redis_client
+    def __init__(self):
         self.default_limit = 100  # requests per window
         self.default_window = 3600  # 1 hour in seconds
 
@@ -25,8 +25,8 @@ class RateLimiter:
             HTTPException: If rate limit is exceeded
         """
         try:
-            # If request is None, skip rate limiting
-            if request is None:
+            # If request is None or limits are disabled, skip rate limiting
+            if request is None or not settings.RATE_LIMIT_ENABLED:
                 return True
             
             # Get client IP
@@ -42,22 +42,24 @@ class RateLimiter:
             key = f"rate_limit:{client_ip}"
 
             # Get current count
-            current = self.redis.get(key)
+            r = await get_redis()
+            current = await r.get(key)
             
             if current is None:
                 # First request, set counter and expiry
-                self.redis.setex(key, window, 1)
+                await r.setex(key, window, 1)
                 return True
             
             current = int(current)
             
             if current >= limit:
                 # Get TTL to show when the limit resets
-                ttl = self.redis.ttl(key)
+                ttl = await r.ttl(key)
                 reset_time = datetime.now() + timedelta(seconds=ttl)
                 reset_time_str = reset_time.strftime("%H:%M:%S")
                 
                 logger.warning(f"⛔ Rate limit exceeded for {client_ip}: {current}/{limit} requests")
+                RATE_LIMIT_REJECTIONS.inc()
                 
                 raise HTTPException(
                     status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -71,8 +73,10 @@ class RateLimiter:
                 )
             
             # Increment counter
-            self.redis.incr(key)
+            await r.incr(key)
             return True
+        except HTTPException:
+            raise
         except RedisError as e:
             # Log the error but don't block the request if Redis is down
             logger.error(f"❌ Redis error in rate limiter: {str(e)}")
@@ -82,14 +86,5 @@ class RateLimiter:
             logger.error(f"❌ Unexpected error in rate limiter: {str(e)}")
             return True
 
-# Create a singleton instance
-try:
-    rate_limiter = RateLimiter(Redis.from_url(settings.REDIS_URL))
-    logger.info("✅ Rate limiter initialized successfully")
-except Exception as e:
-    logger.error(f"❌ Failed to initialize rate limiter: {str(e)}")
-    # Create a dummy rate limiter that always allows requests
-    class DummyRateLimiter:
-        async def check_rate_limit(self, *args, **kwargs):
-            return True
-    rate_limiter = DummyRateLimiter() 
\ No newline at end of file
+# Create a singleton instance; it uses the worker's shared async Redis client
+rate_limiter = RateLimiter()
@@ -0,0 +1,84 @@
+"""
+Shared clients of a worker process.
+
+The app lifespan starts `resources` once per worker: the database pool
+and the Redis connection pool are opened and warmed up before the worker
+reports ready on /health/ready, and both are closed on shutdown. Scripts
+that run outside the app (backfills, archival) use the same clients,
+which then connect on first use.
+"""
+import asyncio
+from typing import Dict, Optional
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import engine
+
+
+class Resources:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.redis: Optional[Redis] = None
+        self.ready = False
+
+    def redis_client(self) -> Redis:
+        """The Redis client; creating it does not connect"""
+        if self.redis is None:
+            pool = BlockingConnectionPool.from_url(
+                settings.REDIS_URL,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                timeout=settings.REDIS_POOL_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+                decode_responses=True,
+            )
+            self.redis = Redis(connection_pool=pool)
+        return self.redis
+
+    async def _ping_database(self):
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def start(self):
+        """
+        Open and warm up the connection pools. The database is required;
+        Redis is not (every Redis feature degrades without it), so a Redis
+        failure is only logged.
+        """
+        # Concurrent checkouts make the pool open DB_POOL_SIZE connections,
+        # which it keeps after they are returned
+        await asyncio.gather(*(self._ping_database() for _ in range(settings.DB_POOL_SIZE)))
+        logger.info(f"✅ Database pool warmed up ({settings.DB_POOL_SIZE} connections)")
+
+        redis = self.redis_client()
+        try:
+            await asyncio.gather(*(redis.ping() for _ in range(settings.REDIS_WARM_CONNECTIONS)))
+            logger.info(f"✅ Redis pool warmed up ({settings.REDIS_WARM_CONNECTIONS} connections)")
+        except RedisError as e:
+            logger.error(f"❌ Redis connection error: {str(e)}")
+
+    async def check(self) -> Dict[str, str]:
+        """Reachability of each backend, for the readiness probe"""
+        status = {}
+        checks = {"database": self._ping_database(), "redis": self.redis_client().ping()}
+        for name, check in checks.items():
+            try:
+                await asyncio.wait_for(check, settings.HEALTH_CHECK_TIMEOUT)
+                status[name] = "ok"
+            except Exception as e:
+                logger.warning(f"⚠️ Readiness check of {name} failed: {str(e) or type(e).__name__}")
+                status[name] = "unavailable"
+        return status
+
+    async def close(self):
+        self.ready = False
+        if self.redis is not None:
+            await self.redis.aclose(close_connection_pool=True)
+            self.redis = None
+        await self.engine.dispose()
+        logger.info("👋 Closed database and Redis connections")
+
+
+resources = Resources(engine)
@@ -0,0 +1,62 @@
+"""
+Per-request phase timing.
+
+Code marks the phases of a request with `span(name)` (SQL statements are
+timed automatically as "db"). The durations of each phase are summed per
+request and reported in a `Server-Timing` response header, which browser
+dev tools display next to the request, and in the
+shrinkr_request_phase_duration_seconds histogram.
+
+Spans may nest, so they do not necessarily add up to the "app" total.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import event
+
+# Phase name -> seconds, for the request being handled (None outside requests)
+_spans: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_spans", default=None)
+
+
+def start_request() -> Dict[str, float]:
+    """Begin collecting spans for the current request"""
+    spans: Dict[str, float] = {}
+    _spans.set(spans)
+    return spans
+
+
+def add_span(name: str, seconds: float):
+    spans = _spans.get()
+    if spans is not None:
+        spans[name] = spans.get(name, 0.0) + seconds
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as phase `name` of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, time.perf_counter() - start)
+
+
+def server_timing_header(spans: Dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans.items()]
+    entries.append(f"app;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def time_queries(engine):
+    """Count the time of every SQL statement on `engine` as the "db" phase"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # SQLAlchemy propagates context variables into the greenlet running
+        # these hooks, so the span lands on the request that ran the query
+        add_span("db", time.perf_counter() - conn.info["query_start"].pop())
@@ -0,0 +1,233 @@
+"""
+Archival of old raw clicks to compressed segment files on local disk.
+
+Clicks older than CLICK_ARCHIVE_AFTER_DAYS are moved out of click_logs one
+UTC day at a time into `{CLICK_ARCHIVE_DIR}/{YYYY}/{MM}/{DD}/{url_id}.ndjson.gz`
+(one JSON object per click, same fields as the export). Files are only
+ever appended to: every write adds a new gzip member, and readers see the
+concatenation. Rollups stay in Postgres, so analytics are unaffected;
+`stream_archived_clicks` lets exports read archived days back.
+
+A day's rows are deleted in the same transaction that archived them, and
+segments appended by a day that fails to commit are truncated back to
+their old size.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import engine
+from app.db.dimensions import CLICK_DETAIL_COLUMNS, click_details
+from app.db.partitions import (
+    PARENT_TABLE, _add_months, list_click_log_partitions, maintenance_lock, partition_name
+)
+
+ARCHIVE_BATCH_SIZE = 10000
+READ_BATCH_SIZE = 1000
+
+ARCHIVE_FIELDS = tuple(column.key for column in CLICK_DETAIL_COLUMNS)
+
+
+def segment_path(day: date, url_id: int) -> str:
+    return os.path.join(
+        settings.CLICK_ARCHIVE_DIR,
+        f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}",
+        f"{url_id}.ndjson.gz"
+    )
+
+
+def _day_bounds(day: date):
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+class _SegmentWriter:
+    """Appends gzip members to segment files and can undo its appends"""
+
+    def __init__(self):
+        self.original_sizes: Dict[str, int] = {}
+
+    def append(self, path: str, lines: List[str]):
+        if path not in self.original_sizes:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.original_sizes[path] = os.path.getsize(path) if os.path.exists(path) else 0
+        with open(path, "ab") as segment:
+            segment.write(gzip.compress("".join(lines).encode()))
+            segment.flush()
+            os.fsync(segment.fileno())
+
+    def rollback(self):
+        for path, size in self.original_sizes.items():
+            if size:
+                with open(path, "r+b") as segment:
+                    segment.truncate(size)
+            elif os.path.exists(path):
+                os.remove(path)
+
+
+def _serialize(row) -> str:
+    values = dict(zip(ARCHIVE_FIELDS, row))
+    values["clicked_at"] = values["clicked_at"].isoformat()
+    return json.dumps(values, separators=(",", ":")) + "\n"
+
+
+async def archive_click_day(conn: AsyncConnection, day: date, writer: _SegmentWriter) -> int:
+    """
+    Move one UTC day of clicks from click_logs into segment files.
+
+    Args:
+        conn: An open connection inside a transaction; the day's rows are
+            deleted in it, so they disappear only if it commits
+        day: The day to archive
+        writer: Segment writer to roll back if the transaction fails
+
+    Returns:
+        The number of archived clicks
+    """
+    start, end = _day_bounds(day)
+    archived = 0
+    result = await conn.stream(
+        select(click_details.c.url_id, *CLICK_DETAIL_COLUMNS)
+        .where(click_details.c.clicked_at >= start)
+        .where(click_details.c.clicked_at < end)
+        .order_by(click_details.c.url_id, click_details.c.clicked_at)
+        .execution_options(yield_per=ARCHIVE_BATCH_SIZE)
+    )
+    url_id, lines = None, []
+    async for rows in result.partitions():
+        for row in rows:
+            if row[0] != url_id and lines:
+                await asyncio.to_thread(writer.append, segment_path(day, url_id), lines)
+                lines = []
+            url_id = row[0]
+            lines.append(_serialize(row[1:]))
+            archived += 1
+        if lines:
+            await asyncio.to_thread(writer.append, segment_path(day, url_id), lines)
+            lines = []
+
+    await conn.execute(
+        text(f"DELETE FROM {PARENT_TABLE} WHERE clicked_at >= :start AND clicked_at < :end"),
+        {"start": start, "end": end}
+    )
+    return archived
+
+
+async def drop_archived_partitions(conn: AsyncConnection, before: date) -> List[str]:
+    """Detach and drop monthly partitions that end before `before` and are empty"""
+    dropped = []
+    for month in await list_click_log_partitions(conn):
+        if _add_months(month, 1) > before:
+            continue
+        name = partition_name(month)
+        empty = (await conn.execute(text(f"SELECT NOT EXISTS (SELECT 1 FROM {name})"))).scalar()
+        if empty:
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name};"))
+            await conn.execute(text(f"DROP TABLE {name};"))
+            dropped.append(name)
+    return dropped
+
+
+async def archive_clicks(before: Optional[date] = None) -> int:
+    """
+    Archive every whole UTC day of clicks before `before` (default:
+    CLICK_ARCHIVE_AFTER_DAYS ago), one transaction per day, then drop
+    monthly partitions that were emptied.
+
+    Returns:
+        The number of archived clicks
+    """
+    before = before or (datetime.now(timezone.utc) - timedelta(days=settings.CLICK_ARCHIVE_AFTER_DAYS)).date()
+    async with engine.connect() as conn:
+        oldest: Optional[datetime] = (await conn.execute(
+            text(f"SELECT min(clicked_at) FROM {PARENT_TABLE} WHERE clicked_at < :before"),
+            {"before": _day_bounds(before)[0]}
+        )).scalar()
+    if not oldest:
+        return 0
+
+    total = 0
+    day = oldest.astimezone(timezone.utc).date()
+    while day < before:
+        writer = _SegmentWriter()
+        try:
+            async with engine.begin() as conn:
+                archived = await archive_click_day(conn, day, writer)
+        except BaseException:
+            # The rows are still in Postgres: undo this day's appends
+            await asyncio.to_thread(writer.rollback)
+            raise
+        if archived:
+            logger.info(f"📦 Archived {archived} clicks from {day.isoformat()}")
+        total += archived
+        day += timedelta(days=1)
+
+    async with engine.begin() as conn:
+        for name in await drop_archived_partitions(conn, before):
+            logger.info(f"🗑️ Dropped archived click log partition: {name}")
+    return total
+
+
+def _read_batch(segment, size: int) -> List[str]:
+    lines = []
+    for line in segment:
+        lines.append(line)
+        if len(lines) >= size:
+            break
+    return lines
+
+
+async def stream_archived_clicks(url_id: int, since: datetime, until: Optional[datetime] = None) -> AsyncIterator[dict]:
+    """
+    Yield archived clicks of a URL from `since` onwards, oldest first, as
+    dicts shaped like the export rows. Files are read in a worker thread
+    one batch at a time.
+    """
+    since = since.astimezone(timezone.utc)
+    day = since.date()
+    last = (until or datetime.now(timezone.utc)).astimezone(timezone.utc).date()
+    while day <= last:
+        path = segment_path(day, url_id)
+        day += timedelta(days=1)
+        if not await asyncio.to_thread(os.path.exists, path):
+            continue
+        segment = await asyncio.to_thread(gzip.open, path, "rt")
+        try:
+            while True:
+                lines = await asyncio.to_thread(_read_batch, segment, READ_BATCH_SIZE)
+                if not lines:
+                    break
+                for line in lines:
+                    row = json.loads(line)
+                    row["clicked_at"] = datetime.fromisoformat(row["clicked_at"])
+                    if row["clicked_at"] >= since:
+                        yield row
+        finally:
+            await asyncio.to_thread(segment.close)
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Archive old raw clicks to compressed segment files")
+    parser.add_argument("--before", type=date.fromisoformat, default=None,
+                        help=f"Archive days before this ISO date (UTC); default is "
+                             f"{settings.CLICK_ARCHIVE_AFTER_DAYS} days ago")
+    args = parser.parse_args()
+
+    # Shares the lock of the workers' maintenance loop, which also archives
+    async with maintenance_lock() as acquired:
+        if not acquired:
+            raise SystemExit("Partition maintenance is running in another process; try again later")
+        total = await archive_clicks(args.before)
+    logger.info(f"✅ Archived {total} clicks to {settings.CLICK_ARCHIVE_DIR}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -3,7 +3,12 @@ from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 # Create engine
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DB_ECHO,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
 
 # Create session factory
 async_session_factory = sessionmaker(
@@ -0,0 +1,248 @@
+"""
+Interned dimension strings of click_logs.
+
+User agents, referrers, devices, browsers and operating systems repeat
+across millions of clicks, so each distinct string is stored once in its
+own table and click rows reference it by integer id. IPs are stored as
+INET. `click_details` joins the strings back in for readers, and the
+ingestion path resolves ids through a per-process LRU cache so a known
+string costs no round trip. Unknown strings are interned in the click's
+own transaction and only cached once it commits.
+"""
+import hashlib
+import ipaddress
+from collections import OrderedDict
+from typing import Dict, Optional
+from sqlalchemy import event, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.logger import logger
+from app.db import models
+
+# Click value -> (click_logs id column, dimension model)
+DIMENSIONS = {
+    "user_agent": ("user_agent_id", models.UserAgent),
+    "referrer": ("referrer_id", models.Referrer),
+    "device_type": ("device_id", models.Device),
+    "browser": ("browser_id", models.Browser),
+    "os": ("os_id", models.OperatingSystem),
+}
+
+click_logs = models.ClickLog.__table__
+
+
+def _click_details():
+    joined = click_logs
+    values = {}
+    for key, (column, model) in DIMENSIONS.items():
+        dimension = model.__table__.alias(f"{key}_dim")
+        joined = joined.outerjoin(dimension, click_logs.c[column] == dimension.c.id)
+        values[key] = dimension.c.value.label(key)
+    return (
+        select(
+            click_logs.c.id,
+            click_logs.c.url_id,
+            click_logs.c.clicked_at,
+            func.host(click_logs.c.ip_address).label("ip_address"),
+            values["user_agent"],
+            values["referrer"],
+            click_logs.c.country,
+            click_logs.c.city,
+            values["device_type"],
+            values["browser"],
+            values["os"],
+            click_logs.c.is_mobile,
+            click_logs.c.is_bot,
+        )
+        .select_from(joined)
+        .subquery("click_details")
+    )
+
+
+# click_logs with its dimension strings joined back in, under the original
+# column names. Postgres flattens the subquery, so filters on url_id and
+# clicked_at still use the index and prune partitions, and joins of
+# columns a query does not use are removed by the planner.
+click_details = _click_details()
+
+# The public fields of a click, as exported and archived
+CLICK_DETAIL_COLUMNS = (
+    click_details.c.clicked_at,
+    click_details.c.ip_address,
+    click_details.c.user_agent,
+    click_details.c.referrer,
+    click_details.c.country,
+    click_details.c.city,
+    click_details.c.device_type,
+    click_details.c.browser,
+    click_details.c.os,
+    click_details.c.is_mobile,
+    click_details.c.is_bot,
+)
+
+
+def value_hash(value: str) -> str:
+    """Key of an interned string; matches md5(value) in Postgres"""
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def inet_or_none(value: Optional[str]) -> Optional[str]:
+    """The address if it is a valid IPv4/IPv6 address, else None"""
+    try:
+        return str(ipaddress.ip_address(value)) if value else None
+    except ValueError:
+        return None
+
+
+class InternCache:
+    """Bounded LRU map of dimension string -> id"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.ids: "OrderedDict[str, int]" = OrderedDict()
+
+    def get(self, value: str) -> Optional[int]:
+        dimension_id = self.ids.get(value)
+        if dimension_id is not None:
+            self.ids.move_to_end(value)
+        return dimension_id
+
+    def put(self, value: str, dimension_id: int):
+        self.ids[value] = dimension_id
+        self.ids.move_to_end(value)
+        if len(self.ids) > self.max_size:
+            self.ids.popitem(last=False)
+
+
+_caches = {key: InternCache(settings.DIMENSION_CACHE_SIZE) for key in DIMENSIONS}
+
+
+_PENDING_KEY = "pending_dimension_ids"
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_ids(session: Session):
+    for key, value, dimension_id in session.info.pop(_PENDING_KEY, ()):
+        _caches[key].put(value, dimension_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_ids(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _intern_statement(missing: Dict[str, str]):
+    """
+    One statement that inserts every missing string (one data-modifying
+    CTE per dimension) and selects the id of each, new or existing.
+    """
+    ids = []
+    for key, value in missing.items():
+        column, model = DIMENSIONS[key]
+        table = model.__table__
+        stmt = insert(table).values(value_hash=value_hash(value), value=value)
+        # DO UPDATE (instead of DO NOTHING) so RETURNING also yields existing rows
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["value_hash"],
+            set_={"value_hash": stmt.excluded.value_hash},
+        ).returning(table.c.id)
+        interned = stmt.cte(f"{key}_interned")
+        ids.append(select(interned.c.id).scalar_subquery().label(column))
+    return select(*ids)
+
+
+async def click_log_values(db: AsyncSession, click: dict) -> dict:
+    """
+    Column values of a click_logs row for a click given as strings.
+
+    Known strings are resolved from the cache. Unknown ones are interned
+    with a single statement on the session's own connection and
+    transaction, so ingestion never holds a second pool connection. Their
+    ids are cached when the session commits and dropped if it rolls back,
+    so an id is only ever cached once its row exists for good.
+
+    Args:
+        db: The session the click row is written with
+        click: Click values with user_agent, referrer, device_type, browser
+            and os as strings (everything else is passed through)
+    """
+    values = {key: value for key, value in click.items() if key not in DIMENSIONS}
+    values["ip_address"] = inet_or_none(click.get("ip_address"))
+
+    missing = {}
+    for key, (column, model) in DIMENSIONS.items():
+        value = click.get(key)
+        values[column] = _caches[key].get(value) if value else None
+        if value and values[column] is None:
+            missing[key] = value
+
+    if missing:
+        row = (await db.execute(_intern_statement(missing))).one()._mapping
+        pending = db.info.setdefault(_PENDING_KEY, [])
+        for key, value in missing.items():
+            column = DIMENSIONS[key][0]
+            values[column] = row[column]
+            pending.append((key, value, row[column]))
+    return values
+
+
+async def has_legacy_click_columns(conn: AsyncConnection) -> bool:
+    """Whether click_logs still stores dimension strings inline"""
+    return (await conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'click_logs' AND column_name = 'user_agent'
+        )
+    """))).scalar()
+
+
+async def normalize_click_logs(conn: AsyncConnection):
+    """
+    One-off migration of inline dimension strings to interned ids and of
+    ip_address from VARCHAR to INET. Addresses that do not parse become NULL.
+    """
+    if not await has_legacy_click_columns(conn):
+        return
+
+    await conn.run_sync(
+        models.Base.metadata.create_all,
+        tables=[model.__table__ for _, model in DIMENSIONS.values()]
+    )
+    for key, (column, model) in DIMENSIONS.items():
+        await conn.execute(text(f"""
+            INSERT INTO {model.__tablename__} (value_hash, value)
+            SELECT DISTINCT md5({key}), {key} FROM click_logs WHERE {key} <> ''
+            ON CONFLICT (value_hash) DO NOTHING;
+        """))
+        await conn.execute(text(f"""
+            ALTER TABLE click_logs
+            ADD COLUMN IF NOT EXISTS {column} INTEGER REFERENCES {model.__tablename__} (id);
+        """))
+
+    # One pass over the table for all dimensions
+    assignments = ",\n".join(
+        f"{column} = (SELECT id FROM {model.__tablename__} d WHERE d.value_hash = md5(c.{key}))"
+        for key, (column, model) in DIMENSIONS.items()
+    )
+    await conn.execute(text(f"UPDATE click_logs c SET {assignments};"))
+    await conn.execute(text(
+        "ALTER TABLE click_logs " + ", ".join(f"DROP COLUMN {key}" for key in DIMENSIONS) + ";"
+    ))
+
+    # Rewrites the table, which also reclaims the space of the dropped columns
+    await conn.execute(text("""
+        CREATE FUNCTION pg_temp.safe_inet(value text) RETURNS inet AS $$
+        BEGIN
+            RETURN value::inet;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql IMMUTABLE;
+    """))
+    await conn.execute(text("""
+        ALTER TABLE click_logs
+        ALTER COLUMN ip_address TYPE INET USING pg_temp.safe_inet(ip_address);
+    """))
+    logger.info("✅ Normalized click_logs dimension columns")
@@ -1,22 +1,89 @@
 from sqlalchemy import text
 from app.db.database import engine
+from app.db.models import Base, ClickRollupHourly, ClickRollupDaily
+from app.db.partitions import convert_click_logs_to_partitioned, ensure_click_log_partitions
+from app.db.dimensions import has_legacy_click_columns, normalize_click_logs
+from app.analytics.rollups import backfill_rollups
+
+# Key of the Postgres advisory lock held while migrating
+MIGRATION_LOCK_ID = 0x5348524B  # "SHRK"
 
 async def run_migrations():
     async with engine.begin() as conn:
+        # Workers starting together migrate one at a time; the lock is
+        # released when this transaction ends, and the statements below
+        # are no-ops once applied
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+
         # Add tags column to urls table
         await conn.execute(text("""
             ALTER TABLE urls 
             ADD COLUMN IF NOT EXISTS tags JSONB;
         """))
 
+        # Composite index for keyset pagination of /urls/list
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_urls_user_id_created_at_id
+            ON urls (user_id, created_at, id);
+        """))
+
         # Add new columns to click_logs table
         await conn.execute(text("""
             ALTER TABLE click_logs 
             ADD COLUMN IF NOT EXISTS country VARCHAR(2),
             ADD COLUMN IF NOT EXISTS city VARCHAR(100),
-            ADD COLUMN IF NOT EXISTS device_type VARCHAR(50),
-            ADD COLUMN IF NOT EXISTS browser VARCHAR(50),
-            ADD COLUMN IF NOT EXISTS os VARCHAR(50),
             ADD COLUMN IF NOT EXISTS is_mobile BOOLEAN DEFAULT FALSE,
             ADD COLUMN IF NOT EXISTS is_bot BOOLEAN DEFAULT FALSE;
-        """)) 
\ No newline at end of file
+        """))
+        if await has_legacy_click_columns(conn):
+            # Inline strings, moved to dimension tables by normalize_click_logs()
+            await conn.execute(text("""
+                ALTER TABLE click_logs 
+                ADD COLUMN IF NOT EXISTS device_type VARCHAR(50),
+                ADD COLUMN IF NOT EXISTS browser VARCHAR(50),
+                ADD COLUMN IF NOT EXISTS os VARCHAR(50);
+            """))
+
+        # Partition click_logs by month and make sure upcoming partitions exist
+        await convert_click_logs_to_partitioned(conn)
+        await ensure_click_log_partitions(conn)
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_click_logs_url_id_clicked_at
+            ON click_logs (url_id, clicked_at);
+        """))
+
+        # Intern dimension strings and store IPs as INET
+        await normalize_click_logs(conn)
+
+        # Click rollup tables, backfilled from raw clicks when first created
+        rollups_exist = (await conn.execute(text(
+            "SELECT to_regclass('click_rollups_daily') IS NOT NULL"
+        ))).scalar()
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[ClickRollupHourly.__table__, ClickRollupDaily.__table__]
+        )
+        if not rollups_exist:
+            await backfill_rollups(conn)
+        else:
+            # Rollups written before the location dimension existed
+            missing_locations = (await conn.execute(text("""
+                SELECT EXISTS (SELECT 1 FROM click_rollups_daily WHERE dimension = '_total')
+                AND NOT EXISTS (SELECT 1 FROM click_rollups_daily WHERE dimension = 'location')
+            """))).scalar()
+            if missing_locations:
+                await backfill_rollups(conn)
+
+        # Rollups go with their URL (tables created before the FK cascaded)
+        for table in (ClickRollupHourly.__tablename__, ClickRollupDaily.__tablename__):
+            cascades = (await conn.execute(text("""
+                SELECT confdeltype = 'c' FROM pg_constraint
+                WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'
+            """), {"table": table})).scalar()
+            if not cascades:
+                await conn.execute(text(f"""
+                    ALTER TABLE {table}
+                    DROP CONSTRAINT IF EXISTS {table}_url_id_fkey,
+                    ADD CONSTRAINT {table}_url_id_fkey
+                    FOREIGN KEY (url_id) REFERENCES urls (id) ON DELETE CASCADE;
+                """))
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON, Boolean
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON, Boolean, Index
+from sqlalchemy.dialects.postgresql import INET
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
@@ -18,6 +19,10 @@ class User(Base):
 
 class URL(Base):
     __tablename__ = 'urls'
+    # Backs keyset pagination of a user's links (newest first)
+    __table_args__ = (
+        Index("ix_urls_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -33,23 +38,77 @@ class URL(Base):
     clicks = relationship("ClickLog", back_populates="url")
 
 
+class DimensionMixin:
+    """An interned string: click rows store its id instead of the text"""
+    id = Column(Integer, primary_key=True)
+    value_hash = Column(String(32), unique=True, nullable=False)  # md5 of value
+    value = Column(Text, nullable=False)
+
+
+class UserAgent(DimensionMixin, Base):
+    __tablename__ = 'user_agents'
+
+
+class Referrer(DimensionMixin, Base):
+    __tablename__ = 'referrers'
+
+
+class Device(DimensionMixin, Base):
+    __tablename__ = 'devices'
+
+
+class Browser(DimensionMixin, Base):
+    __tablename__ = 'browsers'
+
+
+class OperatingSystem(DimensionMixin, Base):
+    __tablename__ = 'operating_systems'
+
+
 class ClickLog(Base):
     __tablename__ = 'click_logs'
+    # Monthly range partitions on clicked_at (see app/db/partitions.py).
+    # Postgres requires the partition key to be part of the primary key.
+    __table_args__ = (
+        Index("ix_click_logs_url_id_clicked_at", "url_id", "clicked_at"),
+        {"postgresql_partition_by": "RANGE (clicked_at)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     url_id = Column(Integer, ForeignKey("urls.id"))
-    clicked_at = Column(DateTime(timezone=True), server_default=func.now())
-    ip_address = Column(String(45), nullable=True)
-    user_agent = Column(Text, nullable=True)
-    referrer = Column(Text, nullable=True)
+    clicked_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    ip_address = Column(INET, nullable=True)
+    # Repeated strings are interned in dimension tables (see app/db/dimensions.py)
+    user_agent_id = Column(Integer, ForeignKey("user_agents.id"), nullable=True)
+    referrer_id = Column(Integer, ForeignKey("referrers.id"), nullable=True)
     country = Column(String(2), nullable=True)
     city = Column(String(100), nullable=True)
-    device_type = Column(String(50), nullable=True)
-    browser = Column(String(50), nullable=True)
-    os = Column(String(50), nullable=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=True)
+    browser_id = Column(Integer, ForeignKey("browsers.id"), nullable=True)
+    os_id = Column(Integer, ForeignKey("operating_systems.id"), nullable=True)
     is_mobile = Column(Boolean, default=False)
     is_bot = Column(Boolean, default=False)
 
     url = relationship("URL", back_populates="clicks")
 
-    
\ No newline at end of file
+
+class ClickRollupHourly(Base):
+    """Click counts per url, hour and dimension value (see app/analytics/rollups.py)"""
+    __tablename__ = 'click_rollups_hourly'
+
+    url_id = Column(Integer, ForeignKey("urls.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    dimension = Column(String(20), primary_key=True)
+    value = Column(String(255), primary_key=True)
+    clicks = Column(Integer, nullable=False, default=0)
+
+
+class ClickRollupDaily(Base):
+    """Click counts per url, day and dimension value (see app/analytics/rollups.py)"""
+    __tablename__ = 'click_rollups_daily'
+
+    url_id = Column(Integer, ForeignKey("urls.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    dimension = Column(String(20), primary_key=True)
+    value = Column(String(255), primary_key=True)
+    clicks = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,38 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+from fastapi import HTTPException, status
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """
+    Encode a keyset position as an opaque, URL-safe cursor.
+
+    Args:
+        timestamp: The sort timestamp of the last row returned
+        row_id: The id of the last row returned (tie-breaker)
+
+    Returns:
+        A base64url string to hand back to the client
+    """
+    payload = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises:
+        HTTPException 400: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
@@ -0,0 +1,264 @@
+import asyncio
+import re
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, List, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.analytics.rollups import prune_hourly_rollups
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import engine
+
+PARENT_TABLE = "click_logs"
+# Catches clicks outside every monthly partition, should maintenance lapse
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+PARTITION_NAME_RE = re.compile(rf"^{PARENT_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+# Key of the Postgres advisory lock held while maintaining partitions
+MAINTENANCE_LOCK_ID = 0x5348524D  # "SHRM"
+
+
+def _month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + (day.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Name of the partition holding the given month, e.g. click_logs_y2025m04"""
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    """Check whether click_logs is already a partitioned table"""
+    result = await conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = :name
+        )
+    """), {"name": PARENT_TABLE})
+    return bool(result.scalar())
+
+
+async def create_default_partition(conn: AsyncConnection):
+    """
+    Create the DEFAULT partition, if missing. If upcoming months were not
+    created in time, clicks land there instead of failing the redirect's
+    INSERT; create_month_partition moves them out later.
+    """
+    await conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION}
+        PARTITION OF {PARENT_TABLE} DEFAULT;
+    """))
+
+
+async def create_month_partition(conn: AsyncConnection, month: date):
+    """
+    Create the partition covering one calendar month (UTC), if missing.
+
+    Postgres refuses to create a partition while the DEFAULT partition
+    holds rows in its range, so such rows are moved into the new table
+    before it is attached.
+
+    Args:
+        conn: An open connection inside a transaction
+        month: Any day within the month to create
+    """
+    start = _month_start(month)
+    end = _add_months(start, 1)
+    name = partition_name(start)
+    bounds = f"FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+    if (await conn.execute(text(f"SELECT to_regclass('{name}') IS NOT NULL"))).scalar():
+        return
+
+    has_default = (await conn.execute(text(f"SELECT to_regclass('{DEFAULT_PARTITION}') IS NOT NULL"))).scalar()
+    if has_default:
+        # Blocks inserts into the default partition until the move commits
+        await conn.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE;"))
+        stray = (await conn.execute(text(f"""
+            SELECT count(*) FROM {DEFAULT_PARTITION}
+            WHERE clicked_at >= '{start.isoformat()} 00:00:00+00' AND clicked_at < '{end.isoformat()} 00:00:00+00'
+        """))).scalar()
+        if stray:
+            await conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS);"))
+            await conn.execute(text(f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION}
+                    WHERE clicked_at >= '{start.isoformat()} 00:00:00+00' AND clicked_at < '{end.isoformat()} 00:00:00+00'
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved;
+            """))
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds};"))
+            logger.warning(f"⚠️ Moved {stray} clicks from {DEFAULT_PARTITION} into the late partition {name}")
+            return
+
+    await conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {name}
+        PARTITION OF {PARENT_TABLE}
+        FOR VALUES {bounds};
+    """))
+
+
+async def ensure_click_log_partitions(conn: AsyncConnection, months_ahead: int = None, since: date = None):
+    """
+    Make sure the DEFAULT partition and monthly partitions from `since`
+    (default: current month) up to `months_ahead` months in the future exist.
+    """
+    months_ahead = settings.CLICK_LOG_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    await create_default_partition(conn)
+    current = _month_start(datetime.now(timezone.utc).date())
+    month = _month_start(since) if since else current
+    last = _add_months(current, months_ahead)
+    while month <= last:
+        await create_month_partition(conn, month)
+        month = _add_months(month, 1)
+
+
+async def list_click_log_partitions(conn: AsyncConnection) -> List[date]:
+    """Return the months of all attached monthly partitions, oldest first"""
+    result = await conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :name
+    """), {"name": PARENT_TABLE})
+    months = []
+    for (name,) in result:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+async def drop_expired_click_log_partitions(conn: AsyncConnection, retention_months: int = None) -> List[str]:
+    """
+    Detach and drop partitions that fall entirely outside the retention window.
+
+    Dropping a whole partition is a metadata operation, so retention never
+    has to DELETE (and later vacuum) individual click rows.
+
+    Returns:
+        The names of the dropped partitions
+    """
+    retention_months = settings.CLICK_LOG_RETENTION_MONTHS if retention_months is None else retention_months
+    if retention_months <= 0:
+        return []
+
+    cutoff = _add_months(_month_start(datetime.now(timezone.utc).date()), -retention_months)
+    dropped = []
+    for month in await list_click_log_partitions(conn):
+        if _add_months(month, 1) > cutoff:
+            continue
+        name = partition_name(month)
+        await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name};"))
+        await conn.execute(text(f"DROP TABLE {name};"))
+        dropped.append(name)
+    return dropped
+
+
+async def convert_click_logs_to_partitioned(conn: AsyncConnection):
+    """
+    One-off migration of an existing plain click_logs table into a
+    monthly range-partitioned table. Existing rows are copied over.
+    """
+    exists = (await conn.execute(text(f"SELECT to_regclass('{PARENT_TABLE}') IS NOT NULL"))).scalar()
+    if not exists or await is_partitioned(conn):
+        return
+
+    legacy = f"{PARENT_TABLE}_unpartitioned"
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {legacy};"))
+    await conn.execute(text(f"UPDATE {legacy} SET clicked_at = now() WHERE clicked_at IS NULL;"))
+    await conn.execute(text(f"""
+        CREATE TABLE {PARENT_TABLE} (LIKE {legacy} INCLUDING DEFAULTS)
+        PARTITION BY RANGE (clicked_at);
+    """))
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ALTER COLUMN clicked_at SET NOT NULL;"))
+
+    # Keep the id sequence alive once the legacy table is dropped
+    sequence = (await conn.execute(text(f"SELECT pg_get_serial_sequence('{legacy}', 'id')"))).scalar()
+    if sequence:
+        await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id;"))
+
+    oldest: Optional[datetime] = (await conn.execute(text(f"SELECT min(clicked_at) FROM {legacy}"))).scalar()
+    await ensure_click_log_partitions(conn, since=oldest.astimezone(timezone.utc).date() if oldest else None)
+
+    await conn.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {legacy};"))
+    await conn.execute(text(f"DROP TABLE {legacy};"))
+
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ADD PRIMARY KEY (id, clicked_at);"))
+    await conn.execute(text(f"""
+        ALTER TABLE {PARENT_TABLE}
+        ADD CONSTRAINT click_logs_url_id_fkey FOREIGN KEY (url_id) REFERENCES urls (id);
+    """))
+    await conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_click_logs_id ON {PARENT_TABLE} (id);"))
+    logger.info("✅ Converted click_logs to monthly partitions")
+
+
+@asynccontextmanager
+async def maintenance_lock() -> AsyncIterator[bool]:
+    """
+    Try to take the cluster-wide maintenance lock, yielding whether it was
+    taken. Every worker runs the maintenance loop, and two archivers
+    working on the same day would write its clicks twice, so only the
+    holder may run. The session-level lock lives on a connection kept for
+    the duration; Postgres releases it if the process dies.
+    """
+    async with engine.connect() as conn:
+        acquired = (await conn.execute(
+            text("SELECT pg_try_advisory_lock(:id)"), {"id": MAINTENANCE_LOCK_ID}
+        )).scalar()
+        # Do not sit idle in a transaction while holding the lock
+        await conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+                await conn.commit()
+
+
+async def run_partition_maintenance():
+    """
+    Create upcoming partitions, archive old clicks, drop the partitions
+    past retention and prune old hourly rollups. Skipped if another
+    process is already doing it.
+    """
+    async with maintenance_lock() as acquired:
+        if not acquired:
+            logger.info("⏭️ Partition maintenance is running elsewhere, skipping")
+            return
+
+        if settings.CLICK_ARCHIVE_AFTER_DAYS > 0:
+            # Imported here: the archive builds on this module
+            from app.db.archive import archive_clicks
+            await archive_clicks()
+
+        async with engine.begin() as conn:
+            await ensure_click_log_partitions(conn)
+            dropped = await drop_expired_click_log_partitions(conn)
+        for name in dropped:
+            logger.info(f"🗑️ Dropped expired click log partition: {name}")
+
+        async with engine.begin() as conn:
+            pruned = await prune_hourly_rollups(conn)
+        if pruned:
+            logger.info(f"🗑️ Pruned {pruned} hourly rollup rows past retention")
+
+
+async def partition_maintenance_loop(interval_seconds: int = None):
+    """Background task that runs partition maintenance periodically"""
+    interval_seconds = interval_seconds or settings.PARTITION_MAINTENANCE_INTERVAL
+    while True:
+        try:
+            await run_partition_maintenance()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Partition maintenance failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
@@ -103,6 +103,7 @@ class URLStatsResponse(BaseModel):
     url: URLListResponse
     clicks: List['ClickLogResponse']
     total_clicks: int
+    next_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -134,6 +135,10 @@ class ClickLogResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class QRBatchRequest(BaseModel):
+    short_codes: List[str] = []
+    tag: Optional[str] = None
+
 # -------------------------------
 # Analytics Schemas
 # -------------------------------
@@ -159,6 +164,11 @@ class OSStats(BaseModel):
     os: str = "Unknown"  # Default to "Unknown" if null
     clicks: int
 
+class HeatmapCell(BaseModel):
+    day_of_week: int  # ISO: 1 = Monday ... 7 = Sunday (UTC)
+    hour: int  # 0-23 (UTC)
+    clicks: int
+
 class DetailedAnalytics(BaseModel):
     total_clicks: int
     unique_visitors: int
@@ -169,6 +179,47 @@ class DetailedAnalytics(BaseModel):
     operating_systems: List[OSStats]
     is_mobile_percentage: float
     is_bot_percentage: float
+    granularity: str = "day"
+    heatmap: List[HeatmapCell] = []
+
+class TopLinkStats(BaseModel):
+    short_code: str
+    original_url: str
+    clicks: int
+
+class TrendingLink(BaseModel):
+    short_code: str
+    score: float  # clicks, each weighted down by half per half-life of age
+    click_count: int
+    original_url: Optional[str] = None  # only for the caller's own links
+
+class TrendingResponse(BaseModel):
+    window: str
+    scope: str
+    links: List[TrendingLink]
+
+class AccountOverview(BaseModel):
+    total_links: int
+    total_clicks: int  # clicks within the window
+    all_time_clicks: int
+    top_links: List[TopLinkStats]
+    time_based: List[TimeBasedStats]
+    devices: List[DeviceStats]
+    is_mobile_percentage: float
+    is_bot_percentage: float
+
+class BatchAnalyticsRequest(BaseModel):
+    short_codes: List[str] = []
+    tag: Optional[str] = None
+
+class LinkAnalytics(BaseModel):
+    short_code: str
+    analytics: DetailedAnalytics
+
+class BatchAnalyticsResponse(BaseModel):
+    links: List[LinkAnalytics]
+    combined: DetailedAnalytics
+    not_found: List[str]
 
 class AnalyticsExport(BaseModel):
     url: URLListResponse
@@ -1,10 +1,20 @@
+import asyncio
 import os
 import sys
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Response, status
+from fastapi.responses import JSONResponse
 from app.api.router import router as api_router
 from app.core.logger import logger
 from app.db.migrations import run_migrations
+from app.db.partitions import partition_maintenance_loop
+from app.url.qr import shutdown_qr_renderer
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, instrument_engine, mark_worker_dead, render_metrics
+from app.core.timing import time_queries
+from app.core.resources import resources
+from app.db.database import engine
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -16,6 +26,32 @@ if python_path and python_path not in sys.path:
     sys.path.append(python_path)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Set up and tear down the resources of this worker.
+    - Open and warm up the database and Redis pools
+    - Execute database migrations (unless RUN_MIGRATIONS_ON_STARTUP is off)
+    - Start background tasks, then report ready
+    """
+    await resources.start()
+    if settings.RUN_MIGRATIONS_ON_STARTUP:
+        await run_migrations()
+        logger.info("✅ Database migrations completed")
+
+    # Keep click log partitions rolling forward and enforce retention
+    partition_maintenance = asyncio.create_task(partition_maintenance_loop())
+    resources.ready = True
+    try:
+        yield
+    finally:
+        resources.ready = False
+        partition_maintenance.cancel()
+        shutdown_qr_renderer()
+        await resources.close()
+        mark_worker_dead()
+
+
 app = FastAPI(
     title="Shrinkr+",
     description="""
@@ -37,6 +73,7 @@ app = FastAPI(
     Register or login to obtain your token.
     """,
     version="1.0.0",
+    lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_tags=[
@@ -65,18 +102,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+time_queries(engine)
 
-@app.on_event("startup")
-async def startup_event():
-    """
-    Run tasks when the application starts.
-    - Execute database migrations
-    - Initialize any required services
-    """
-    # Run database migrations
-    await run_migrations()
-    logger.info("✅ Database migrations completed")
+# Registered before the API router, whose /{short_code} redirect would match it
+@app.get(settings.METRICS_PATH, include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint, aggregated across workers"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    """The process is up and its event loop is responsive"""
+    return {"status": "ok"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    """Whether this worker should receive traffic: started and its database reachable"""
+    checks = await resources.check()
+    ready = resources.ready and checks["database"] == "ok"
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "unavailable", "checks": checks},
+    )
 
 app.include_router(api_router)
 
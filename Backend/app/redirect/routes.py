@@ -1,19 +1,63 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, status, Path
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timezone
 from ua_parser import user_agent_parser
 import traceback
 
-from app.db import models
 from app.db.database import get_async_session
 from app.core.logger import logger
-from app.cache.redis_handler import get_cached_url, set_cached_url
+from app.cache.redis_handler import CachedURL, get_cached_url, set_cached_url
+from app.redirect.utils import resolve_short_code, record_click
+from app.analytics.producer import record_click_signals
+from app.core.metrics import CLICKS_IN_FLIGHT
+from app.core.timing import span
 
 router = APIRouter(tags=["Redirect"])
 
+def click_values(request: Request) -> dict:
+    """
+    Column values of a click (as strings) from the redirect request.
+
+    Args:
+        request: The redirect request, if any
+    """
+    # Get client info
+    ip_address = "127.0.0.1"  # Default in case client info is not available
+    referrer = None
+    user_agent_string = ""
+    
+    if request:
+        ip_address = request.client.host if request.client else ip_address
+        referrer = request.headers.get("referer")
+        user_agent_string = request.headers.get("user-agent", "")
+
+    # Parse user agent
+    try:
+        with span("ua"):
+            ua_info = user_agent_parser.Parse(user_agent_string)
+    except Exception as e:
+        logger.warning(f"Failed to parse user agent: {str(e)}")
+        ua_info = {
+            "device": {"family": "Unknown", "is_mobile": False},
+            "user_agent": {"family": "Unknown"},
+            "os": {"family": "Unknown"}
+        }
+
+    return dict(
+        ip_address=ip_address,
+        user_agent=user_agent_string,
+        referrer=referrer,
+        country=None,  # TODO: Add IP geolocation
+        city=None,     # TODO: Add IP geolocation
+        device_type=ua_info.get("device", {}).get("family"),
+        browser=ua_info.get("user_agent", {}).get("family"),
+        os=ua_info.get("os", {}).get("family"),
+        is_mobile=ua_info.get("device", {}).get("is_mobile", False),
+        is_bot=ua_info.get("user_agent", {}).get("family") in ["Bot", "Crawler", "Spider"]
+    )
+
 @router.get(
     "/{short_code}", 
     response_class=RedirectResponse,
@@ -56,15 +100,20 @@ async def redirect_to_original(
             )
 
         # Try cache first
-        cached_url = await get_cached_url(short_code)
+        with span("cache"):
+            cached_url = await get_cached_url(short_code)
         if cached_url:
-            logger.info(f"⚡ Cache hit: {short_code}")
-            return RedirectResponse(cached_url)
+            # No click row is written for a cache hit, but it still counts
+            # towards trending and is shown to live viewers
+            click = click_values(request)
+            with span("signals"):
+                await record_click_signals(cached_url.url_id, click, cached_url.user_id, recorded=False)
+            with span("log"):
+                logger.info("⚡ Cache hit: %s", short_code, extra={"sample": "cache_hit"})
+            return RedirectResponse(cached_url.original_url)
 
-        # Fallback: look up in DB
-        stmt = select(models.URL).where(models.URL.short_code == short_code)
-        result = await db.execute(stmt)
-        url: models.URL = result.scalar_one_or_none()
+        # Fallback: resolve in DB without hydrating an ORM object
+        url = await resolve_short_code(db, short_code)
 
         if not url:
             logger.warning(f"🔍 Short URL not found: {short_code}")
@@ -89,61 +138,33 @@ async def redirect_to_original(
                 detail="Click limit exceeded"
             )
 
-        # Get client info
-        ip_address = "127.0.0.1"  # Default in case client info is not available
-        referrer = None
-        user_agent_string = ""
-        
-        if request:
-            ip_address = request.client.host if request.client else ip_address
-            referrer = request.headers.get("referer")
-            user_agent_string = request.headers.get("user-agent", "")
-
-        # Parse user agent
-        try:
-            ua_info = user_agent_parser.Parse(user_agent_string)
-        except Exception as e:
-            logger.warning(f"Failed to parse user agent: {str(e)}")
-            ua_info = {
-                "device": {"family": "Unknown", "is_mobile": False},
-                "user_agent": {"family": "Unknown"},
-                "os": {"family": "Unknown"}
-            }
-
-        # Create click log
-        click_log = models.ClickLog(
-            url_id=url.id,
-            ip_address=ip_address,
-            user_agent=user_agent_string,
-            referrer=referrer,
-            country=None,  # TODO: Add IP geolocation
-            city=None,     # TODO: Add IP geolocation
-            device_type=ua_info.get("device", {}).get("family"),
-            browser=ua_info.get("user_agent", {}).get("family"),
-            os=ua_info.get("os", {}).get("family"),
-            is_mobile=ua_info.get("device", {}).get("is_mobile", False),
-            is_bot=ua_info.get("user_agent", {}).get("family") in ["Bot", "Crawler", "Spider"]
-        )
+        # Click log values
+        click = click_values(request)
 
-        # Update click count
-        url.click_count += 1
-        
+        # Record the click and update click count
+        CLICKS_IN_FLIGHT.inc()
         try:
-            db.add(click_log)
+            await record_click(db, url.id, click)
             await db.commit()
+            with span("signals"):
+                await record_click_signals(url.id, click, url.user_id)
         except SQLAlchemyError as e:
             # Log the error but continue with the redirect
             logger.error(f"❌ Database error recording click: {str(e)}")
             await db.rollback()
+        finally:
+            CLICKS_IN_FLIGHT.dec()
 
         # Cache it for faster future access
         try:
-            await set_cached_url(short_code, url.original_url)
+            with span("cache"):
+                await set_cached_url(short_code, CachedURL(url.original_url, url.id, url.user_id))
         except Exception as e:
             # Log the error but continue with the redirect
             logger.error(f"❌ Cache error: {str(e)}")
 
-        logger.info(f"🔁 Redirected /{short_code} → {url.original_url}")
+        with span("log"):
+            logger.info("🔁 Redirected /%s → %s", short_code, url.original_url, extra={"sample": "redirect"})
         return RedirectResponse(url.original_url)
     
     except HTTPException:
@@ -0,0 +1,78 @@
+from typing import NamedTuple, Optional
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import models
+from app.analytics.rollups import record_click_rollups
+from app.db.dimensions import click_log_values
+
+
+class ResolvedURL(NamedTuple):
+    id: int
+    user_id: Optional[int]
+    original_url: str
+    expires_at: Optional[datetime]
+    click_limit: Optional[int]
+    click_count: int
+
+
+urls = models.URL.__table__
+click_logs = models.ClickLog.__table__
+
+# Core statements built once at import: SQLAlchemy reuses the compiled
+# form from its statement cache and asyncpg keeps the server-side prepared
+# statement per connection, so resolution is a single Bind/Execute round trip.
+RESOLVE_SHORT_CODE = (
+    select(
+        urls.c.id,
+        urls.c.user_id,
+        urls.c.original_url,
+        urls.c.expires_at,
+        urls.c.click_limit,
+        urls.c.click_count,
+    )
+    .where(urls.c.short_code == bindparam("short_code"))
+)
+
+INCREMENT_CLICK_COUNT = (
+    update(urls)
+    .where(urls.c.id == bindparam("url_id"))
+    .values(click_count=urls.c.click_count + 1)
+)
+
+INSERT_CLICK_LOG = insert(click_logs)
+
+
+async def resolve_short_code(db: AsyncSession, short_code: str) -> Optional[ResolvedURL]:
+    """
+    Resolve a short code to the columns the redirect needs, without
+    hydrating an ORM object or touching the session identity map.
+
+    Args:
+        db: The database session
+        short_code: The short code to resolve
+
+    Returns:
+        A ResolvedURL tuple, or None if the short code does not exist
+    """
+    result = await db.execute(RESOLVE_SHORT_CODE, {"short_code": short_code})
+    row = result.first()
+    return ResolvedURL(*row) if row else None
+
+
+async def record_click(db: AsyncSession, url_id: int, click: dict):
+    """
+    Insert a click log row, bump the URL's click counter and add the click
+    to the analytics rollups, all in the current transaction. The counters
+    are incremented in SQL, so concurrent redirects never lose an update.
+    Dimension strings are stored as interned ids (see app/db/dimensions.py).
+
+    Args:
+        db: The database session
+        url_id: The database ID of the clicked URL
+        click: Click values as strings (without url_id)
+    """
+    clicked_at = click.setdefault("clicked_at", datetime.now(timezone.utc))
+    await db.execute(INSERT_CLICK_LOG, {"url_id": url_id, **await click_log_values(db, click)})
+    await db.execute(INCREMENT_CLICK_COUNT, {"url_id": url_id})
+    await record_click_rollups(db, url_id, click, clicked_at)
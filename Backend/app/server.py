@@ -0,0 +1,110 @@
+"""
+Production entry point: `python -m app.server`.
+
+Runs WORKERS uvicorn worker processes (0 = one per CPU core) under
+uvicorn's process supervisor, which restarts workers that exit. Each
+worker uses uvloop and httptools when they are installed, and is
+recycled after WORKER_MAX_REQUESTS requests to bound memory growth. The
+limit is drawn per worker within WORKER_MAX_REQUESTS_JITTER, so workers
+under even load do not all restart, and go unready, at the same moment.
+
+Every recycled worker leaves its counter and histogram files behind in
+PROMETHEUS_MULTIPROC_DIR (they hold its share of the totals), so /metrics
+reads one more set of files per recycle and gets slower to scrape over
+a long uptime. The directory is reset whenever the server starts; keep
+WORKER_MAX_REQUESTS high enough that recycles stay in the hundreds
+between deploys.
+
+On SIGTERM/SIGINT workers stop accepting connections and get up to
+GRACEFUL_SHUTDOWN_TIMEOUT seconds to finish in-flight requests before
+their lifespan closes the connection pools. A redirect writes its click
+before responding, so draining requests is what flushes clicks; only
+long-lived streams (live click SSE) are cut off at the timeout.
+
+Before the workers start, migrations run once here (so workers skip
+them) and the Prometheus multiprocess directory is reset.
+"""
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import uvicorn
+from uvicorn.main import STARTUP_FAILURE
+from uvicorn.supervisors import Multiprocess
+from app.core.config import settings
+
+
+def worker_count() -> int:
+    return settings.WORKERS or os.cpu_count() or 1
+
+
+class _RecyclingServer(uvicorn.Server):
+    """A uvicorn server whose request limit is drawn when its worker starts"""
+
+    def run(self, sockets=None):
+        limit = self.config.limit_max_requests
+        if limit:
+            jitter = int(limit * settings.WORKER_MAX_REQUESTS_JITTER)
+            self.config.limit_max_requests = limit + random.randint(-jitter, jitter)
+        return super().run(sockets=sockets)
+
+
+def _prepare_metrics_dir():
+    """Give the workers an empty shared directory for their metrics"""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "shrinkr-metrics")
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+
+async def _migrate():
+    from app.core.logger import logger
+    from app.db.database import engine
+    from app.db.migrations import run_migrations
+
+    await run_migrations()
+    await engine.dispose()
+    logger.info("✅ Database migrations completed")
+
+
+def main():
+    workers = worker_count()
+    reload = settings.RELOAD and settings.is_development() and workers == 1
+
+    if not reload:
+        # Set before the app is imported anywhere: app.core.metrics reads it on import
+        _prepare_metrics_dir()
+        if settings.RUN_MIGRATIONS_ON_STARTUP:
+            asyncio.run(_migrate())
+            # Inherited by the workers, whose settings are loaded from the environment
+            os.environ["RUN_MIGRATIONS_ON_STARTUP"] = "false"
+
+    if reload:
+        uvicorn.run("app.main:app", host=settings.HOST, port=settings.PORT, reload=True)
+        return
+
+    config = uvicorn.Config(
+        "app.main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=workers,
+        loop="auto",  # uvloop if installed
+        http="auto",  # httptools if installed
+        limit_max_requests=settings.WORKER_MAX_REQUESTS or None,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+    )
+    # What uvicorn.run does, with a server that draws its own request
+    # limit: every worker process runs a copy of it
+    server = _RecyclingServer(config)
+    if workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+        if not server.started:
+            sys.exit(STARTUP_FAILURE)
+
+
+if __name__ == "__main__":
+    main()
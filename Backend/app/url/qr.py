@@ -0,0 +1,211 @@
+"""
+QR code rendering with a content-addressed disk cache.
+
+An image is identified by the SHA-256 of what it encodes and how it is
+drawn (data, box size, format), so the digest doubles as its ETag and
+conditional requests can be answered before any rendering or disk access.
+Cache misses are rendered in a bounded thread pool, never on the event
+loop, and written atomically to `{QR_CACHE_DIR}/{digest[:2]}/{digest}.{format}`.
+
+Batches are rendered in chunks across a process pool and streamed out as
+a ZIP archive. SVG images are drawn as a single path without PIL.
+"""
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import AsyncIterator, List, Optional, Tuple
+import qrcode
+from qrcode.image.svg import SvgPathImage
+from app.core.config import settings
+from app.core.logger import logger
+
+QR_MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+BATCH_CHUNK_SIZE = 50
+
+_executor: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.QR_RENDER_WORKERS, thread_name_prefix="qr")
+    return _executor
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that runs an event loop is unsafe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.QR_BATCH_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_qr_renderer():
+    """Stop the render pools (waits for renders in progress)"""
+    global _executor, _process_pool
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True)
+        _process_pool = None
+
+
+def qr_digest(data: str, size: int, fmt: str) -> str:
+    return hashlib.sha256(f"{fmt}:{size}:{data}".encode()).hexdigest()
+
+
+def qr_etag(digest: str) -> str:
+    return f'"{digest[:32]}"'
+
+
+def _cache_path(digest: str, fmt: str) -> str:
+    return os.path.join(settings.QR_CACHE_DIR, digest[:2], f"{digest}.{fmt}")
+
+
+def render_qr(data: str, size: int, fmt: str = "png") -> bytes:
+    """Render a QR code image (blocking)"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=size,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    if fmt == "svg":
+        img = qr.make_image(image_factory=SvgPathImage)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer)
+    return buffer.getvalue()
+
+
+def _load_or_render(data: str, size: int, fmt: str, digest: str) -> bytes:
+    path = _cache_path(digest, fmt)
+    try:
+        with open(path, "rb") as cached:
+            return cached.read()
+    except FileNotFoundError:
+        pass
+
+    image = render_qr(data, size, fmt)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(image)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"⚠️ Could not cache QR code {digest[:12]}: {str(e)}")
+    return image
+
+
+async def get_qr_image(data: str, size: int, fmt: str = "png", digest: Optional[str] = None) -> bytes:
+    """
+    A QR code image from the disk cache, rendered off the event loop on a miss.
+
+    Args:
+        data: The text to encode
+        size: Box size in pixels
+        fmt: Image format (see QR_MEDIA_TYPES)
+        digest: qr_digest() of the arguments, if already computed
+    """
+    digest = digest or qr_digest(data, size, fmt)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _load_or_render, data, size, fmt, digest)
+
+
+def _render_chunk(items: List[Tuple[str, str, int, str, str]]) -> List[Tuple[str, bytes]]:
+    """Process pool task: (name, data, size, fmt, digest) -> (name, image)"""
+    return [(name, _load_or_render(data, size, fmt, digest)) for name, data, size, fmt, digest in items]
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable target that hands out what the ZIP writer wrote"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def _write_entries(archive: zipfile.ZipFile, entries: List[Tuple[str, bytes]], compression: int):
+    for name, data in entries:
+        archive.writestr(name, data, compress_type=compression)
+
+
+async def stream_qr_zip(
+    codes: List[str], base_url: str, size: int, fmt: str = "png", missing: Optional[List[str]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Render QR codes for many short codes and stream them as a ZIP archive.
+
+    Chunks of BATCH_CHUNK_SIZE codes are rendered across the process pool
+    with at most two chunks per process in flight, and each chunk is
+    written out as soon as it is ready, so memory use does not grow with
+    the batch. PNGs are stored as is (already compressed), SVGs deflated.
+
+    Args:
+        codes: Short codes to render, in archive order
+        base_url: Prefix of the encoded short URLs
+        size: Box size in pixels
+        fmt: Image format (see QR_MEDIA_TYPES)
+        missing: Requested short codes that were not found, listed in missing.txt
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_process_pool()
+    compression = zipfile.ZIP_DEFLATED if fmt == "svg" else zipfile.ZIP_STORED
+    chunks = deque(
+        [
+            (f"{code}.{fmt}", f"{base_url}{code}", size, fmt, qr_digest(f"{base_url}{code}", size, fmt))
+            for code in codes[start:start + BATCH_CHUNK_SIZE]
+        ]
+        for start in range(0, len(codes), BATCH_CHUNK_SIZE)
+    )
+    in_flight = deque()
+    max_in_flight = 2 * settings.QR_BATCH_PROCESSES
+
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, mode="w")
+    try:
+        while chunks or in_flight:
+            while chunks and len(in_flight) < max_in_flight:
+                in_flight.append(loop.run_in_executor(pool, _render_chunk, chunks.popleft()))
+            entries = await in_flight.popleft()
+            await asyncio.to_thread(_write_entries, archive, entries, compression)
+            yield sink.drain()
+
+        if missing:
+            archive.writestr("missing.txt", "\n".join(missing) + "\n")
+        archive.close()
+        yield sink.drain()
+    finally:
+        for future in in_flight:
+            future.cancel()
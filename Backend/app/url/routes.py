@@ -1,20 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query, Path
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func
+from sqlalchemy import cast, func, or_, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
 from app.db import models, schemas
-from app.db.database import get_async_session
+from app.db.database import get_async_session, async_session_factory
+from app.db.pagination import encode_cursor, decode_cursor
+from app.db.dimensions import click_details
 from app.auth.deps import get_current_user
 from app.core.logger import logger
 from app.core.rate_limiter import rate_limiter
 from app.core.config import settings
+from app.core.timing import span
 from app.cache.redis_handler import invalidate_url_cache
+from app.analytics.service import window_start
 import secrets
-from datetime import datetime, timedelta
-from typing import List, Optional
-import qrcode
-from io import BytesIO
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal, Optional
+from app.url.qr import QR_MEDIA_TYPES, get_qr_image, qr_digest, qr_etag, stream_qr_zip
 from fastapi.responses import StreamingResponse
 from PIL import Image
 
@@ -35,6 +39,17 @@ def generate_short_code(length: int = None) -> str:
         length = settings.MAX_URL_CODE_LENGTH
     return secrets.token_urlsafe(length)[:length]
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def _as_utc(value: datetime) -> datetime:
+    """Treat naive query timestamps as UTC"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
 @router.post(
     "/create", 
     response_model=schemas.URLCreateResponse,
@@ -65,7 +80,8 @@ async def create_short_url(
     """
     try:
         # Check rate limit
-        await rate_limiter.check_rate_limit(request, limit=50, window=3600)  # 50 requests per hour
+        with span("rate_limit"):
+            await rate_limiter.check_rate_limit(request, limit=50, window=3600)  # 50 requests per hour
 
         # Check daily limit
         result = await db.execute(
@@ -171,7 +187,8 @@ async def bulk_create_urls(
     """
     try:
         # Check rate limit
-        await rate_limiter.check_rate_limit(request, limit=10, window=3600)  # 10 bulk creates per hour
+        with span("rate_limit"):
+            await rate_limiter.check_rate_limit(request, limit=10, window=3600)  # 10 bulk creates per hour
 
         # Limit batch size
         if len(urls_data.urls) > settings.MAX_BULK_URLS:
@@ -247,6 +264,25 @@ async def bulk_create_urls(
             detail="An error occurred while processing the bulk URL creation"
         )
 
+def _user_urls_page(user_id: int, limit: int, cursor: Optional[str] = None):
+    """
+    Build a keyset-paginated query over a user's URLs, newest first.
+
+    Rows are ordered by (created_at, id) descending, which matches the
+    ix_urls_user_id_created_at_id index, so each page is an index range
+    scan no matter how deep into the list it is.
+    """
+    stmt = (
+        select(models.URL)
+        .where(models.URL.user_id == user_id)
+        .order_by(models.URL.created_at.desc(), models.URL.id.desc())
+        .limit(limit)
+    )
+    if cursor:
+        created_at, url_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(models.URL.created_at, models.URL.id) < tuple_(created_at, url_id))
+    return stmt
+
 @router.get(
     "/list", 
     response_model=List[schemas.URLListResponse],
@@ -255,32 +291,42 @@ async def bulk_create_urls(
 )
 async def list_user_urls(
     request: Request,
-    skip: int = Query(0, ge=0, description="Number of items to skip"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Number of items to skip (deprecated, use cursor)"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of items to return"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
     db: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     List all shortened URLs belonging to the current user.
     
+    Pages are cursor based: when more results are available the response
+    carries an `X-Next-Cursor` header; pass its value as `cursor` to fetch
+    the next page. `skip` is still honored for existing clients but gets
+    slower the deeper it goes.
+    
     Returns:
     - A list of URL objects ordered by creation date (newest first)
     
     Raises:
-    - HTTPException: For rate limiting
+    - HTTPException: For rate limiting or an invalid cursor
     """
     try:
         # Check rate limit
-        await rate_limiter.check_rate_limit(request, limit=100, window=3600)  # 100 requests per hour
+        with span("rate_limit"):
+            await rate_limiter.check_rate_limit(request, limit=100, window=3600)  # 100 requests per hour
 
-        result = await db.execute(
-            select(models.URL)
-            .where(models.URL.user_id == current_user.id)
-            .order_by(models.URL.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-        )
+        stmt = _user_urls_page(current_user.id, limit, cursor)
+        if skip and not cursor:
+            stmt = stmt.offset(skip)
+
+        result = await db.execute(stmt)
         urls = result.scalars().all()
+
+        if len(urls) == limit:
+            last = urls[-1]
+            response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
         return urls
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -292,6 +338,51 @@ async def list_user_urls(
             detail="An error occurred while retrieving the URLs"
         )
 
+@router.get(
+    "/list/stream",
+    summary="Stream all of a user's URLs",
+    description="Stream every shortened URL of the authenticated user as newline-delimited JSON.",
+    response_class=StreamingResponse
+)
+async def stream_user_urls(
+    request: Request,
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Stream the complete list of the current user's URLs as NDJSON.
+    
+    The list is walked in keyset pages of `URL_STREAM_BATCH_SIZE` rows,
+    so memory stays flat and no page ever needs an OFFSET.
+    
+    Returns:
+    - An `application/x-ndjson` stream, one URL object per line
+    
+    Raises:
+    - HTTPException: For rate limiting
+    """
+    with span("rate_limit"):
+        await rate_limiter.check_rate_limit(request, limit=10, window=3600)  # 10 full exports per hour
+    user_id = current_user.id
+
+    async def generate():
+        # Own session: request-scoped dependencies are closed before the body is streamed
+        async with async_session_factory() as session:
+            cursor = None
+            while True:
+                result = await session.execute(
+                    _user_urls_page(user_id, settings.URL_STREAM_BATCH_SIZE, cursor)
+                )
+                urls = result.scalars().all()
+                for url in urls:
+                    yield schemas.URLListResponse.model_validate(url).model_dump_json() + "\n"
+                if len(urls) < settings.URL_STREAM_BATCH_SIZE:
+                    break
+                cursor = encode_cursor(urls[-1].created_at, urls[-1].id)
+                session.expunge_all()
+
+    logger.info(f"📤 Streaming URL list for user: {current_user.email}")
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @router.get(
     "/{short_code}/stats", 
     response_model=schemas.URLStatsResponse,
@@ -300,20 +391,38 @@ async def list_user_urls(
 )
 async def get_url_stats(
     short_code: str = Path(..., description="The short code of the URL"),
+    days: int = Query(
+        default=settings.ANALYTICS_MAX_DAYS,
+        ge=1,
+        le=settings.ANALYTICS_MAX_DAYS,
+        description=f"Number of days of click history to include (1-{settings.ANALYTICS_MAX_DAYS})"
+    ),
+    start: Optional[datetime] = Query(None, description="Only include clicks at or after this time (overrides days)"),
+    end: Optional[datetime] = Query(None, description="Only include clicks before this time"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of clicks to return"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from next_cursor of the previous page"),
     db: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Get basic usage statistics for a specific shortened URL.
     
+    Click history is returned newest first, one bounded page at a time.
+    When more clicks are available `next_cursor` is set; pass it back as
+    `cursor` to fetch the next page.
+    
     Parameters:
     - **short_code**: The short code of the URL to retrieve stats for
+    - **days** (optional): Number of days of click history to include (default: {settings.ANALYTICS_MAX_DAYS})
+    - **start** / **end** (optional): Explicit time range for the click history
+    - **limit** (optional): Page size (default: 100, max: 1000)
+    - **cursor** (optional): Continue from a previous page
     
     Returns:
-    - URL details along with click history and total clicks
+    - URL details along with a page of click history and total clicks
     
     Raises:
-    - HTTPException: If URL not found or unauthorized access
+    - HTTPException: If URL not found, unauthorized access or an invalid cursor
     """
     try:
         # Get URL and verify ownership
@@ -327,18 +436,35 @@ async def get_url_stats(
         if not url:
             raise HTTPException(status_code=404, detail="URL not found or access denied")
 
-        # Get click logs
-        result = await db.execute(
-            select(models.ClickLog)
-            .where(models.ClickLog.url_id == url.id)
-            .order_by(models.ClickLog.clicked_at.desc())
+        # Get one page of click logs; both time bounds let Postgres prune partitions
+        stmt = (
+            select(click_details)
+            .where(click_details.c.url_id == url.id)
+            .where(click_details.c.clicked_at >= (_as_utc(start) if start else window_start(days)))
+            .order_by(click_details.c.clicked_at.desc(), click_details.c.id.desc())
+            .limit(limit)
         )
-        clicks = result.scalars().all()
+        if end:
+            stmt = stmt.where(click_details.c.clicked_at < _as_utc(end))
+        if cursor:
+            clicked_at, click_id = decode_cursor(cursor)
+            stmt = stmt.where(
+                tuple_(click_details.c.clicked_at, click_details.c.id) < tuple_(clicked_at, click_id)
+            )
+
+        result = await db.execute(stmt)
+        clicks = result.mappings().all()
+
+        next_cursor = None
+        if len(clicks) == limit:
+            next_cursor = encode_cursor(clicks[-1]["clicked_at"], clicks[-1]["id"])
 
         return {
             "url": url,
             "clicks": clicks,
-            "total_clicks": len(clicks)
+            # Maintained counter instead of counting every click row
+            "total_clicks": url.click_count or 0,
+            "next_cursor": next_cursor
         }
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -413,7 +539,8 @@ async def update_url(
 
         # Invalidate cache if the original URL was changed
         if original_url_changed:
-            await invalidate_url_cache(short_code)
+            with span("cache"):
+                await invalidate_url_cache(short_code)
             logger.info(f"🔄 Invalidated cache for updated URL: {short_code}")
 
         logger.info(f"🔄 Updated URL: {short_code} for user: {current_user.email}")
@@ -475,7 +602,8 @@ async def delete_url(
         await db.commit()
         
         # Invalidate cache
-        await invalidate_url_cache(short_code)
+        with span("cache"):
+            await invalidate_url_cache(short_code)
 
         logger.info(f"🗑️ Deleted URL: {short_code} for user: {current_user.email}")
         return {"message": "URL deleted successfully"}
@@ -497,11 +625,116 @@ async def delete_url(
             detail="An error occurred while deleting the URL"
         )
 
+@router.post(
+    "/qr/batch",
+    summary="Generate QR codes in bulk",
+    description="Generate QR codes for a list of short codes or a tag, streamed as a ZIP archive.",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/zip": {}}}}
+)
+async def generate_qr_codes(
+    batch: schemas.QRBatchRequest,
+    request: Request = None,
+    size: int = Query(
+        default=settings.QR_CODE_DEFAULT_SIZE, 
+        ge=settings.QR_CODE_MIN_SIZE, 
+        le=settings.QR_CODE_MAX_SIZE, 
+        description=f"QR code box size ({settings.QR_CODE_MIN_SIZE}-{settings.QR_CODE_MAX_SIZE})"
+    ),
+    format: Literal["png", "svg"] = Query(
+        default=settings.QR_CODE_DEFAULT_FORMAT, description="Image format; svg skips PIL and renders faster"
+    ),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Generate QR codes for many shortened URLs in one request.
+    
+    Images are rendered in parallel across worker processes and the ZIP
+    archive is streamed as they are ready, one `{short_code}.{format}`
+    entry per link. Requested short codes that were not found are listed
+    in `missing.txt`.
+    
+    Parameters:
+    - **short_codes** (body): Short codes to include
+    - **tag** (body): Include every link with this tag
+    - **size** (optional): Box size for the QR codes (default: 10)
+    - **format** (optional): png or svg (default: {settings.QR_CODE_DEFAULT_FORMAT}, as for single QR codes)
+    
+    Returns:
+    - A ZIP archive of QR code images
+    
+    Raises:
+    - HTTPException: If the batch is empty, lists or selects more than {settings.QR_BATCH_MAX} links, unauthorized, or rate limited
+    """
+    try:
+        # Check rate limit
+        if request:
+            with span("rate_limit"):
+                await rate_limiter.check_rate_limit(request, limit=10, window=3600)
+
+        if not batch.short_codes and not batch.tag:
+            raise HTTPException(status_code=400, detail="Provide short_codes or a tag")
+        if len(batch.short_codes) > settings.QR_BATCH_MAX:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Maximum {settings.QR_BATCH_MAX} short codes allowed per batch"
+            )
+
+        # Get short codes and verify ownership in one query
+        selectors = []
+        if batch.short_codes:
+            selectors.append(models.URL.short_code.in_(batch.short_codes))
+        if batch.tag:
+            selectors.append(cast(models.URL.tags, JSONB).contains([batch.tag]))
+        # One row past the cap tells a tag that selects too many links apart
+        result = await db.execute(
+            select(models.URL.short_code)
+            .where(models.URL.user_id == current_user.id)
+            .where(or_(*selectors))
+            .order_by(models.URL.id)
+            .limit(settings.QR_BATCH_MAX + 1)
+        )
+        codes = result.scalars().all()
+        if len(codes) > settings.QR_BATCH_MAX:
+            raise HTTPException(
+                status_code=400,
+                detail=f"The selection matches more than {settings.QR_BATCH_MAX} links; narrow it down"
+            )
+
+        found = set(codes)
+        missing = [code for code in dict.fromkeys(batch.short_codes) if code not in found]
+
+        # Get base URL for redirection
+        base_url = "http://localhost:8000/"
+        if request:
+            base_url = str(request.base_url)
+
+        filename = f"qr_codes_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.zip"
+        logger.info(f"📱 Generating {len(codes)} QR codes ({format}) for user: {current_user.email}")
+        return StreamingResponse(
+            stream_qr_zip(codes, base_url, size, format, missing),
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"'
+            }
+        )
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error generating QR codes: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate QR codes"
+        )
+
 @router.get(
     "/{short_code}/qr",
     summary="Generate QR code",
     description="Generate a QR code for a shortened URL.",
-    response_class=StreamingResponse
+    response_class=Response,
+    responses={200: {"content": {"image/png": {}, "image/svg+xml": {}}}, 304: {"description": "Not modified"}}
 )
 async def generate_qr_code(
     short_code: str = Path(..., description="The short code of the URL"),
@@ -512,18 +745,24 @@ async def generate_qr_code(
         le=settings.QR_CODE_MAX_SIZE, 
         description=f"QR code box size ({settings.QR_CODE_MIN_SIZE}-{settings.QR_CODE_MAX_SIZE})"
     ),
+    format: Literal["png", "svg"] = Query(default=settings.QR_CODE_DEFAULT_FORMAT, description="Image format"),
     db: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Generate a QR code for a shortened URL.
     
+    Images are cached by content, rendered off the event loop, and served
+    with an ETag: send it back in If-None-Match to get a 304 instead of the
+    image.
+    
     Parameters:
     - **short_code**: The short code of the URL to generate a QR code for
     - **size**: Box size for the QR code (default: 10)
+    - **format** (optional): png or svg (default: {settings.QR_CODE_DEFAULT_FORMAT})
     
     Returns:
-    - A PNG image of the QR code
+    - A PNG or SVG image of the QR code, or 304 if the client's copy is current
     
     Raises:
     - HTTPException: If URL not found, unauthorized access, or QR code generation fails
@@ -531,17 +770,16 @@ async def generate_qr_code(
     try:
         # Check rate limit
         if request:
-            await rate_limiter.check_rate_limit(request, limit=50, window=3600)
+            with span("rate_limit"):
+                await rate_limiter.check_rate_limit(request, limit=50, window=3600)
 
         # Get URL and verify ownership
         result = await db.execute(
-            select(models.URL)
+            select(models.URL.id)
             .where(models.URL.short_code == short_code)
             .where(models.URL.user_id == current_user.id)
         )
-        url = result.scalar_one_or_none()
-        
-        if not url:
+        if result.scalar_one_or_none() is None:
             raise HTTPException(status_code=404, detail="URL not found or access denied")
 
         # Get base URL for redirection
@@ -549,26 +787,22 @@ async def generate_qr_code(
         if request:
             base_url = str(request.base_url)
 
-        # Generate QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=size,
-            border=4,
-        )
-        qr.add_data(f"{base_url}{short_code}")
-        qr.make(fit=True)
+        data = f"{base_url}{short_code}"
+        digest = qr_digest(data, size, format)
+        headers = {
+            "ETag": qr_etag(digest),
+            "Cache-Control": f"private, max-age={settings.QR_CACHE_MAX_AGE}",
+        }
 
-        # Create image
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save to bytes
-        img_byte_arr = BytesIO()
-        img.save(img_byte_arr)
-        img_byte_arr.seek(0)
+        # The ETag is known before rendering, so revalidation is free
+        if request and _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        with span("qr"):
+            image = await get_qr_image(data, size, format, digest)
 
         logger.info(f"📱 Generated QR code for URL: {short_code}")
-        return StreamingResponse(img_byte_arr, media_type="image/png")
+        return Response(content=image, media_type=QR_MEDIA_TYPES[format], headers=headers)
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
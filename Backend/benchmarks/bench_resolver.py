@@ -0,0 +1,51 @@
+"""
+Compare short code resolution through the ORM against the lean Core
+resolver used by the redirect path.
+
+Usage (from Backend/, against the database in DATABASE_URL):
+
+    python -m benchmarks.bench_resolver <short_code> [--iterations 5000]
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy.future import select
+from app.db import models
+from app.db.database import async_session_factory
+from app.redirect.utils import resolve_short_code
+
+
+async def resolve_orm(session, short_code: str):
+    result = await session.execute(select(models.URL).where(models.URL.short_code == short_code))
+    url = result.scalar_one_or_none()
+    # Mirror the request lifecycle: a fresh identity map per redirect
+    session.expunge_all()
+    return url
+
+
+async def bench(label: str, resolver, short_code: str, iterations: int):
+    async with async_session_factory() as session:
+        # Warm up the connection, statement cache and prepared statement
+        for _ in range(50):
+            await resolver(session, short_code)
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await resolver(session, short_code)
+        elapsed = time.perf_counter() - started
+
+    print(f"{label:<6} {iterations / elapsed:>10.0f} ops/s  {elapsed / iterations * 1e6:>8.1f} µs/op")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("short_code")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    await bench("orm", resolve_orm, args.short_code, args.iterations)
+    await bench("core", resolve_short_code, args.short_code, args.iterations)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
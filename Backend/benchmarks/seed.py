@@ -0,0 +1,178 @@
+"""
+Database setup and seed data for the load benchmark (see benchmarks/load.py).
+
+Everything is written in bulk SQL, and access tokens are minted with the
+app's SECRET_KEY, so seeding needs no running server. Short codes are
+`b0000001`, `b0000002`, ... and URL i belongs to the ((i - 1) % users)-th
+user, so the load driver can compute owners without queries.
+Clicks are skewed towards the first URLs and spread over the last 30
+days, with rollups and unique visitor sketches backfilled afterwards.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+SEED_PASSWORD = "benchmark-password"
+CLICK_DAYS = 30
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+]
+DIMENSION_VALUES = {
+    "user_agents": USER_AGENTS,
+    "referrers": ["https://www.google.com/", "https://t.co/", "https://news.ycombinator.com/", "https://www.reddit.com/"],
+    "devices": ["Other", "iPhone", "Mac", "Pixel 8"],
+    "browsers": ["Chrome", "Mobile Safari", "Safari", "Chrome Mobile", "Firefox"],
+    "operating_systems": ["Windows", "iOS", "Mac OS X", "Android", "Linux"],
+}
+COUNTRIES = ["US", "IN", "DE", "GB", "BR", "FR", "JP", "CA"]
+
+
+def short_code(index: int) -> str:
+    """Short code of the seeded URL with 1-based `index`"""
+    return f"b{index:07d}"
+
+
+async def recreate_database(database_url: str):
+    """
+    Drop and create the benchmark database. Refuses database names that
+    do not end in "_bench", so a misconfigured URL cannot wipe real data.
+    """
+    url = make_url(database_url)
+    name = url.database
+    if not name or not name.endswith("_bench"):
+        raise SystemExit(f"Refusing to recreate database {name!r}: benchmark database names must end in _bench")
+
+    conn = await asyncpg.connect(
+        user=url.username, password=url.password, host=url.host, port=url.port or 5432, database="postgres"
+    )
+    try:
+        await conn.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        await conn.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        await conn.close()
+
+
+async def create_schema():
+    from app.db.database import engine
+    from app.db.migrations import run_migrations
+    from app.db.models import Base
+    from app.db.partitions import ensure_click_log_partitions
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_click_log_partitions(
+            conn, since=(datetime.now(timezone.utc) - timedelta(days=CLICK_DAYS)).date()
+        )
+    await run_migrations()
+
+
+async def seed_users(count: int):
+    from app.auth.utils import hash_password
+    from app.db.database import engine
+
+    # Hashing is deliberately slow, and every user shares the password
+    password_hash = hash_password(SEED_PASSWORD)
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("INSERT INTO users (email, password_hash) VALUES (:email, :password_hash)"),
+            [{"email": f"bench{index}@example.com", "password_hash": password_hash} for index in range(count)],
+        )
+
+
+async def load_users() -> List[Tuple[int, str]]:
+    """Seeded users in seeding order, as (user id, access token) pairs"""
+    from app.auth.tokens import create_access_token
+    from app.db.database import engine
+
+    async with engine.connect() as conn:
+        ids = (await conn.execute(text(
+            "SELECT id FROM users WHERE email LIKE 'bench%@example.com' ORDER BY id"
+        ))).scalars().all()
+    return [(user_id, create_access_token(data={"sub": str(user_id)})) for user_id in ids]
+
+
+async def count_urls() -> int:
+    from app.db.database import engine
+
+    async with engine.connect() as conn:
+        return (await conn.execute(text("SELECT count(*) FROM urls WHERE short_code LIKE 'b%'"))).scalar()
+
+
+async def seed_urls(user_ids: List[int], count: int):
+    from app.db.database import engine
+
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            INSERT INTO urls (user_id, original_url, short_code, created_at, click_count)
+            SELECT
+                (CAST(:user_ids AS int[]))[1 + (i - 1) % cardinality(CAST(:user_ids AS int[]))],
+                'https://example.com/articles/' || i || '?utm_source=bench',
+                'b' || lpad(i::text, 7, '0'),
+                now() - (random() * interval '90 days'),
+                0
+            FROM generate_series(1, CAST(:count AS int)) AS i
+        """), {"user_ids": user_ids, "count": count})
+
+
+async def seed_clicks(url_count: int, hot_urls: int, clicks: int):
+    """
+    Insert `clicks` raw clicks, 80% on the first `hot_urls` URLs with a
+    power-law skew and the rest spread over every URL.
+    """
+    from app.analytics.rollups import backfill_rollups
+    from app.analytics.unique_visitors import backfill_unique_visitors
+    from app.db.database import engine
+    from app.db.dimensions import value_hash
+
+    async with engine.begin() as conn:
+        for table, values in DIMENSION_VALUES.items():
+            await conn.execute(
+                text(f"INSERT INTO {table} (value_hash, value) VALUES (:value_hash, :value) ON CONFLICT DO NOTHING"),
+                [{"value_hash": value_hash(value), "value": value} for value in values],
+            )
+
+        await conn.execute(text("""
+            INSERT INTO click_logs (
+                url_id, clicked_at, ip_address, user_agent_id, referrer_id, country,
+                device_id, browser_id, os_id, is_mobile, is_bot
+            )
+            SELECT
+                u.id,
+                now() - (random() * interval '30 days'),
+                ('10.' || (random() * 255)::int || '.' || (random() * 255)::int || '.' || (random() * 255)::int)::inet,
+                ua.id, CASE WHEN random() < 0.4 THEN NULL ELSE ref.id END,
+                (CAST(:countries AS text[]))[1 + floor(random() * cardinality(CAST(:countries AS text[])))::int],
+                dev.id, br.id, os.id, ua.id IN (2, 4), false
+            FROM (
+                SELECT
+                    CASE WHEN random() < 0.8
+                        THEN 1 + floor(power(random(), 3) * CAST(:hot_urls AS int))::int
+                        ELSE 1 + floor(random() * CAST(:url_count AS int))::int
+                    END AS url_index,
+                    1 + floor(random() * 5)::int AS ua_id,
+                    1 + floor(random() * 4)::int AS ref_id
+                FROM generate_series(1, CAST(:clicks AS int))
+            ) c
+            JOIN urls u ON u.short_code = 'b' || lpad(c.url_index::text, 7, '0')
+            JOIN user_agents ua ON ua.id = c.ua_id
+            JOIN referrers ref ON ref.id = c.ref_id
+            JOIN devices dev ON dev.id = 1 + (c.ua_id - 1) % 4
+            JOIN browsers br ON br.id = c.ua_id
+            JOIN operating_systems os ON os.id = c.ua_id
+        """), {"countries": COUNTRIES, "hot_urls": hot_urls, "url_count": url_count, "clicks": clicks})
+
+        await conn.execute(text("""
+            UPDATE urls SET click_count = counts.clicks
+            FROM (SELECT url_id, count(*) AS clicks FROM click_logs GROUP BY url_id) counts
+            WHERE urls.id = counts.url_id
+        """))
+        await backfill_rollups(conn)
+
+    await backfill_unique_visitors()